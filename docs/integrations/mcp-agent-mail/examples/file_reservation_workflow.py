@@ -4,11 +4,15 @@ Complete file reservation workflow example.
 Demonstrates: reserve → check conflicts → renew → release
 """
 
+import os
 import sys
 import asyncio
 from datetime import datetime, timedelta
 
-sys.path.insert(0, '/Users/buddhi/.config/opencode/droids')
+# Add Factory droids to path (once; override with OPENCODE_DROIDS_DIR)
+DROIDS_DIR = os.environ.get("OPENCODE_DROIDS_DIR", "/Users/buddhi/.config/opencode/droids")
+if DROIDS_DIR not in sys.path:
+    sys.path.insert(0, DROIDS_DIR)
 
 from mcp_agent_mail_client import (
     register_agent,
@@ -19,16 +23,17 @@ from mcp_agent_mail_client import (
 
 
 class FileReservationWorkflow:
-    def __init__(self, mcp_client):
+    def __init__(self, mcp_client, simulate_delay=0.0):
         self.mcp_client = mcp_client
         self.project_key = get_project_key()
         self.agent_name = "reservation-demo"
+        # Seconds of simulated editing work in the workflow demo (0 = none)
+        self.simulate_delay = simulate_delay
         
     async def initialize(self):
         """Register as an agent."""
         result = await register_agent(
             mcp_client=self.mcp_client,
-            project_key=self.project_key,
             agent_name=self.agent_name,
             model="gpt-4",
             task_description="File reservation workflow demo"
@@ -66,7 +71,6 @@ class FileReservationWorkflow:
         
         result = await reserve_file_paths(
             mcp_client=self.mcp_client,
-            project_key=self.project_key,
             agent_name=self.agent_name,
             paths=files_to_edit,
             ttl_seconds=7200,  # 2 hours
@@ -96,18 +100,18 @@ class FileReservationWorkflow:
         print()
         
         # Step 2: Simulate editing work
-        print("STEP 2: Simulate editing work")
-        print("-" * 60)
-        print("Status: Editing reserved files...")
-        print("        • src/auth/login.py - modified")
-        print("        • src/auth/providers/oauth.py - modified")
-        print("        • tests/auth/test_login.py - added new tests")
-        print()
+        print(
+            f"STEP 2: Simulate editing work\n{'-' * 60}\n"
+            "Status: Editing reserved files...\n"
+            "        • src/auth/login.py - modified\n"
+            "        • src/auth/providers/oauth.py - modified\n"
+            "        • tests/auth/test_login.py - added new tests\n"
+        )
         
         # Simulate work duration
-        await asyncio.sleep(1)
-        print("✓ Edits completed")
-        print()
+        if self.simulate_delay:
+            await asyncio.sleep(self.simulate_delay)
+        print("✓ Edits completed\n")
         
         # Step 3: Check if reservation needs renewal
         print("STEP 3: Check reservation status")
@@ -131,7 +135,6 @@ class FileReservationWorkflow:
         
         result = await release_file_reservations(
             mcp_client=self.mcp_client,
-            project_key=self.project_key,
             agent_name=self.agent_name
         )
         
@@ -158,33 +161,24 @@ class FileReservationWorkflow:
         print("Simulating two agents editing the same files simultaneously...")
         print()
         
-        # Agent A reserves files
+        # Agent A and Agent B reserve the same files at the same time
         print("Agent A (you) reserves: src/core/*.py")
-        result_a = await reserve_file_paths(
-            mcp_client=self.mcp_client,
-            project_key=self.project_key,
-            agent_name="agent-a",
-            paths=["src/core/*.py"],
-            ttl_seconds=3600,
-            exclusive=False
-        )
+        print("Agent B (teammate) tries to reserve: src/core/*.py")
+        result_a, result_b = await asyncio.gather(*(
+            reserve_file_paths(
+                mcp_client=self.mcp_client,
+                agent_name=agent_name,
+                paths=["src/core/*.py"],
+                ttl_seconds=3600,
+                exclusive=False
+            )
+            for agent_name in ("agent-a", "agent-b")
+        ))
+        print()
         
         if result_a.get("success"):
             print("✓ Agent A reservation successful")
         
-        print()
-        
-        # Agent B tries to reserve the same files
-        print("Agent B (teammate) tries to reserve: src/core/*.py")
-        result_b = await reserve_file_paths(
-            mcp_client=self.mcp_client,
-            project_key=self.project_key,
-            agent_name="agent-b",
-            paths=["src/core/*.py"],
-            ttl_seconds=3600,
-            exclusive=False
-        )
-        
         if result_b.get("success"):
             reservation = result_b["response"]
             
@@ -206,6 +200,12 @@ class FileReservationWorkflow:
         print("=" * 60)
 
 
+# Canned MockMCPClient replies; only the granted path and reason vary per call
+_MOCK_GRANT_BASE = {"id": 123, "expires_ts": "2025-12-26T14:00:00Z"}
+_MOCK_RELEASED = {"result": {"released": 1}}
+_MOCK_OK = {"result": {"success": True}}
+
+
 # Example usage
 async def main():
     print("\nFile Reservation Workflow Demonstration")
@@ -218,21 +218,17 @@ async def main():
             
             if tool_name == "reserve_file_paths":
                 # Simulate successful reservation
-                return {
-                    "result": {
-                        "granted": [{
-                            "id": 123,
-                            "path_pattern": arguments["arguments"]["paths"][0],
-                            "expires_ts": "2025-12-26T14:00:00Z",
-                            "reason": arguments["arguments"].get("reason", "")
-                        }],
-                        "conflicts": []
-                    }
+                tool_args = arguments["arguments"]
+                granted = {
+                    **_MOCK_GRANT_BASE,
+                    "path_pattern": tool_args["paths"][0],
+                    "reason": tool_args.get("reason", "")
                 }
+                return {"result": {"granted": [granted], "conflicts": []}}
             elif tool_name == "release_file_reservations":
-                return {"result": {"released": 1}}
+                return _MOCK_RELEASED
             
-            return {"result": {"success": True}}
+            return _MOCK_OK
     
     mcp_client = MockMCPClient()
     workflow = FileReservationWorkflow(mcp_client)
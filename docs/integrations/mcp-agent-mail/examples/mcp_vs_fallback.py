@@ -7,7 +7,10 @@ automatically falling back to direct execution when MCP is unavailable.
 """
 
 import sys
+import time
+import random
 import asyncio
+import logging
 from typing import Dict, Any, Optional
 
 sys.path.insert(0, '/Users/buddhi/.config/opencode/droids')
@@ -17,20 +20,116 @@ from mcp_agent_mail_client import (
     send_message,
     reserve_file_paths,
     release_file_reservations,
-    get_project_key
+    get_project_key,
+    close_client
 )
 
+logger = logging.getLogger(__name__)
+
+# Fixed demo timestamps for task messages and direct-mode completions
+_FIXED_TS = "2025-12-26T12:00:00Z"
+_FIXED_COMPLETE_TS = "2025-12-26T12:01:00Z"
+
+
+class CircuitBreaker:
+    """
+    Skip MCP calls while the server keeps failing (see lib/circuit-breaker.js).
+
+    After failure_threshold consecutive failures the circuit opens and
+    can_execute() returns False, so callers go straight to their fallback.
+    Once reset_timeout seconds have passed it half-opens and lets up to
+    half_open_calls probe calls through: that many successes close it again,
+    any failure opens it again.
+    """
+
+    CLOSED = "CLOSED"
+    OPEN = "OPEN"
+    HALF_OPEN = "HALF_OPEN"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 half_open_calls: int = 3):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_calls = half_open_calls
+
+        self.state = self.CLOSED
+        self.failure_count = 0
+        self.success_count = 0
+        self._half_open_attempted_calls = 0
+        self._opened_at = None
+
+    def can_execute(self) -> bool:
+        """Return True if a call may go through (counts as a half-open probe)."""
+        if self.state == self.OPEN:
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                return False
+            self._transition_to(self.HALF_OPEN)
+
+        if self.state == self.HALF_OPEN:
+            if self._half_open_attempted_calls >= self.half_open_calls:
+                return False
+            self._half_open_attempted_calls += 1
+
+        return True
+
+    def record_outcome(self, success: bool) -> None:
+        """
+        Record the result of a call allowed by can_execute().
+
+        success means the server handled the call; a request it answered
+        but refused is not a failure of the server.
+        """
+        if success:
+            if self.state == self.HALF_OPEN:
+                self.success_count += 1
+                if self.success_count >= self.half_open_calls:
+                    self._transition_to(self.CLOSED)
+            elif self.state == self.CLOSED:
+                self.failure_count = 0
+        elif self.state == self.HALF_OPEN:
+            self._transition_to(self.OPEN)
+        elif self.state == self.CLOSED:
+            self.failure_count += 1
+            if self.failure_count >= self.failure_threshold:
+                self._transition_to(self.OPEN)
+
+    def _transition_to(self, new_state: str) -> None:
+        self.state = new_state
+        if new_state == self.OPEN:
+            self._opened_at = time.monotonic()
+        elif new_state == self.HALF_OPEN:
+            self._half_open_attempted_calls = 0
+            self.success_count = 0
+        elif new_state == self.CLOSED:
+            self.failure_count = 0
+            self._opened_at = None
+
 
 class FlexibleOrchestrator:
     """
     Orchestrator that automatically chooses between MCP and direct execution.
     """
+
+    # Constant part of every task_assignment message
+    _MSG_TEMPLATE = {"version": "1.0.0", "type": "task_assignment"}
+
+    # Seconds to wait for MCP before treating a call as failed
+    MCP_INIT_TIMEOUT = 2.0
+    MCP_CALL_TIMEOUT = 5.0
     
-    def __init__(self):
+    def __init__(self, max_concurrency: int = 16):
         self.project_key = get_project_key()
         self.agent_name = "flexible-orchestrator"
         self.mode = None  # "mcp" or "direct"
         self.mcp_client = None
+        # Bulkheads: caps on concurrent MCP calls, one for message sends and
+        # one for everything else, so a backlog of one kind can't starve the other
+        self._send_sem = asyncio.Semaphore(max_concurrency)
+        self._mcp_sem = asyncio.Semaphore(max_concurrency)
+        # Sends tasks straight to direct mode while MCP keeps failing
+        self.breaker = CircuitBreaker()
+        self.retries_total = 0
+        self.retries_exhausted_total = 0
         
     async def initialize(self, mcp_client: Optional[Any] = None):
         """
@@ -39,9 +138,7 @@ class FlexibleOrchestrator:
         Args:
             mcp_client: Optional MCP client (if None, uses direct mode)
         """
-        print("Initializing FlexibleOrchestrator...")
-        print(f"Project: {self.project_key}")
-        print()
+        logger.info("Initializing FlexibleOrchestrator...\nProject: %s\n", self.project_key)
         
         # Try MCP mode first
         if mcp_client:
@@ -50,30 +147,77 @@ class FlexibleOrchestrator:
                 if success:
                     self.mode = "mcp"
                     self.mcp_client = mcp_client
-                    print("✓ Mode: MCP Agent Mail")
+                    logger.info("✓ Mode: MCP Agent Mail")
                     return self.mode
             except Exception as e:
-                print(f"⚠ MCP initialization failed: {e}")
+                logger.warning("⚠ MCP initialization failed: %s", e)
         
         # Fall back to direct mode
         self.mode = "direct"
-        print("✓ Mode: Direct Execution")
+        logger.info("✓ Mode: Direct Execution")
         return self.mode
     
     async def _try_mcp_mode(self, mcp_client) -> bool:
         """Attempt to initialize MCP mode."""
         try:
-            result = await register_agent(
-                mcp_client=mcp_client,
-                project_key=self.project_key,
-                agent_name=self.agent_name,
-                model="gpt-4",
-                task_description="Flexible orchestrator with MCP support"
+            result = await asyncio.wait_for(
+                register_agent(
+                    mcp_client=mcp_client,
+                    agent_name=self.agent_name,
+                    model="gpt-4",
+                    task_description="Flexible orchestrator with MCP support"
+                ),
+                timeout=self.MCP_INIT_TIMEOUT
             )
             return result.get("success", False)
-        except Exception:
+        except Exception:  # Includes asyncio.TimeoutError
             return False
+
+    async def _mcp_call(self, coro, bulkhead: Optional[asyncio.Semaphore] = None
+                        ) -> Dict[str, Any]:
+        """
+        Await an MCP helper, reporting a timeout as a failed, retryable result.
+
+        The call waits for a slot in bulkhead (default: the shared MCP one);
+        the timeout only covers the call itself, not the wait.
+        """
+        try:
+            async with bulkhead or self._mcp_sem:
+                return await asyncio.wait_for(coro, timeout=self.MCP_CALL_TIMEOUT)
+        except asyncio.TimeoutError:
+            return {
+                "success": False,
+                "response": None,
+                "error": f"MCP call timed out after {self.MCP_CALL_TIMEOUT}s",
+                "retryable": True
+            }
+        finally:
+            coro.close()  # No-op once awaited; avoids a never-awaited warning
     
+    async def _retry(self, op, *, attempts: int = 3, base: float = 0.1, cap: float = 2.0,
+                     jitter: float = 0.1) -> Dict[str, Any]:
+        """
+        Call op() until its result succeeds, at most `attempts` times.
+
+        op must start a new call each time (e.g. a lambda around _mcp_call).
+        Only failures marked retryable (timeouts, transport errors, 5xx
+        replies) are retried; anything else, such as a reservation the server
+        refused, is returned at once. Retry n sleeps min(cap, base * 2**n)
+        seconds, randomized by +/- jitter.
+        """
+        result = await op()
+        for attempt in range(attempts - 1):
+            if result.get("success") or not result.get("retryable"):
+                return result
+            delay = min(cap, base * 2 ** attempt) * (1 + random.uniform(-jitter, jitter))
+            await asyncio.sleep(delay)
+            self.retries_total += 1
+            result = await op()
+
+        if result.get("retryable"):
+            self.retries_exhausted_total += 1
+        return result
+
     async def delegate_task(self, task_id: str, description: str, specialist: str,
                            file_patterns: list, priority: str = "normal") -> Dict[str, Any]:
         """
@@ -91,49 +235,57 @@ class FlexibleOrchestrator:
     async def _delegate_task_mcp(self, task_id: str, description: str, specialist: str,
                                 file_patterns: list, priority: str) -> Dict[str, Any]:
         """Delegate task using MCP Agent Mail."""
-        print(f"→ [MCP MODE] Delegating {task_id} to {specialist}")
+        if not self.breaker.can_execute():
+            logger.warning("   ⚠ MCP circuit open, delegating %s directly", task_id)
+            return await self._delegate_task_direct(task_id, description, specialist,
+                                                   file_patterns, priority)
+
+        logger.info("→ [MCP MODE] Delegating %s to %s", task_id, specialist)
         
         # Reserve files first
-        print(f"   Reserving files: {file_patterns}")
-        reserve_result = await reserve_file_paths(
+        logger.info("   Reserving files: %s", file_patterns)
+        reserve_result = await self._retry(lambda: self._mcp_call(reserve_file_paths(
             mcp_client=self.mcp_client,
-            project_key=self.project_key,
             agent_name=self.agent_name,
             paths=file_patterns,
             ttl_seconds=3600,
             exclusive=False
-        )
+        )))
         
         if not reserve_result.get("success"):
-            print(f"   ⚠ File reservation failed: {reserve_result.get('error')}")
+            logger.warning("   ⚠ File reservation failed: %s", reserve_result.get('error'))
             # Continue anyway - reservation is advisory
         else:
-            print(f"   ✓ Files reserved")
+            logger.info("   ✓ Files reserved")
         
         # Send task assignment message
         message_content = {
-            "version": "1.0.0",
-            "timestamp": "2025-12-26T12:00:00Z",
+            **self._MSG_TEMPLATE,
+            "timestamp": _FIXED_TS,
             "sender_id": self.agent_name,
             "message_id": f"msg-{task_id}",
-            "type": "task_assignment",
             "task_id": task_id,
             "description": description,
             "file_patterns": file_patterns,
             "priority": priority
         }
         
-        send_result = await send_message(
+        send_result = await self._retry(lambda: self._mcp_call(send_message(
             mcp_client=self.mcp_client,
-            project_key=self.project_key,
             sender_name=self.agent_name,
             recipient_name=specialist,
             content=message_content,
             importance=priority
+        ), self._send_sem))
+        # One outcome per delegation, matching its single can_execute() check;
+        # only failures that point at the server (retryable ones) count, not
+        # refusals such as a conflicting (advisory) reservation
+        self.breaker.record_outcome(
+            not reserve_result.get("retryable") and not send_result.get("retryable")
         )
         
         if send_result.get("success"):
-            print(f"   ✓ Task message sent via MCP")
+            logger.info("   ✓ Task message sent via MCP")
             response = send_result["response"]
             return {
                 "status": "delegated",
@@ -143,22 +295,25 @@ class FlexibleOrchestrator:
                 "delivery_time": response.get("created_ts")
             }
         else:
-            print(f"   ✗ MCP send failed: {send_result.get('error')}")
             # Fall back to direct execution
-            print(f"   → Falling back to direct mode for this task")
+            logger.warning(
+                "   ✗ MCP send failed: %s\n   → Falling back to direct mode for this task",
+                send_result.get('error')
+            )
             return await self._delegate_task_direct(task_id, description, specialist,
                                                    file_patterns, priority)
     
     async def _delegate_task_direct(self, task_id: str, description: str, specialist: str,
                                    file_patterns: list, priority: str) -> Dict[str, Any]:
         """Delegate task using direct execution (no MCP)."""
-        print(f"→ [DIRECT MODE] Executing {task_id} as {specialist}")
-        print(f"   Description: {description}")
-        print(f"   Files: {file_patterns}")
-        print(f"   Priority: {priority}")
+        logger.info(
+            "→ [DIRECT MODE] Executing %s as %s\n   Description: %s\n   Files: %s\n"
+            "   Priority: %s",
+            task_id, specialist, description, file_patterns, priority
+        )
         
         # Simulate task execution
-        print(f"   ⏳ Executing task...")
+        logger.info("   ⏳ Executing task...")
         await asyncio.sleep(1)  # Simulate work
         
         result = {
@@ -166,10 +321,10 @@ class FlexibleOrchestrator:
             "mode": "direct",
             "specialist": specialist,
             "output": f"Task {task_id} completed directly",
-            "completion_time": "2025-12-26T12:01:00Z"
+            "completion_time": _FIXED_COMPLETE_TS
         }
         
-        print(f"   ✓ Task completed directly")
+        logger.info("   ✓ Task completed directly")
         return result
     
     async def reserve_resources(self, paths: list, exclusive: bool = False) -> bool:
@@ -180,43 +335,55 @@ class FlexibleOrchestrator:
             bool: True if reservation successful or not needed (direct mode)
         """
         if self.mode != "mcp":
-            print(f"   [DIRECT MODE] Would reserve: {paths}")
+            logger.info("   [DIRECT MODE] Would reserve: %s", paths)
             return True  # Direct mode doesn't need reservations
         
-        result = await reserve_file_paths(
+        result = await self._mcp_call(reserve_file_paths(
             mcp_client=self.mcp_client,
-            project_key=self.project_key,
             agent_name=self.agent_name,
             paths=paths,
             ttl_seconds=3600,
             exclusive=exclusive
-        )
+        ))
         
         success = result.get("success", False)
         if success:
-            print(f"   [MCP MODE] ✓ Reserved: {paths}")
+            logger.info("   [MCP MODE] ✓ Reserved: %s", paths)
         else:
-            print(f"   [MCP MODE] ⚠ Reservation failed: {result.get('error')}")
+            logger.warning("   [MCP MODE] ⚠ Reservation failed: %s", result.get('error'))
         
         return success
     
     async def release_resources(self):
         """Release all reservations if in MCP mode."""
         if self.mode != "mcp":
-            print(f"   [DIRECT MODE] No reservations to release")
+            logger.info("   [DIRECT MODE] No reservations to release")
             return
         
-        result = await release_file_reservations(
+        result = await self._mcp_call(release_file_reservations(
             mcp_client=self.mcp_client,
-            project_key=self.project_key,
             agent_name=self.agent_name
-        )
+        ))
         
         if result.get("success"):
             released = result["response"].get("released", 0)
-            print(f"   [MCP MODE] ✓ Released {released} reservation(s)")
+            logger.info("   [MCP MODE] ✓ Released %s reservation(s)", released)
         else:
-            print(f"   [MCP MODE] ⚠ Release failed: {result.get('error')}")
+            logger.warning("   [MCP MODE] ⚠ Release failed: %s", result.get('error'))
+    
+    async def close(self):
+        """Close the MCP client (if it has a close() method)."""
+        close = getattr(self.mcp_client, "close", None)
+        if close is not None:
+            result = close()
+            if asyncio.iscoroutine(result):
+                await result
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
     
     def get_status(self) -> Dict[str, Any]:
         """Get current status and capabilities."""
@@ -233,8 +400,19 @@ class FlexibleOrchestrator:
         }
 
 
+class MockMCPClient:
+    """Stand-in MCP client for the demo (real usage gets one from Factory)."""
+
+    async def call_tool(self, name, arguments):
+        tool_name = arguments.get("tool_name", name)
+        print(f"   [MCP Call: {tool_name}]")
+        return {"result": {"success": True}}
+
+
 # Example usage
 async def main():
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
     print("=" * 70)
     print("MCP vs Fallback: Side-by-Side Comparison")
     print("=" * 70)
@@ -245,56 +423,55 @@ async def main():
     print("SCENARIO 1: MCP Agent Mail Available")
     print("-" * 70)
     
-    class MockMCPClient:
-        async def call_tool(self, name, arguments):
-            tool_name = arguments.get("tool_name", name)
-            print(f"   [MCP Call: {tool_name}]")
-            return {"result": {"success": True}}
-    
-    orchestrator_mcp = FlexibleOrchestrator()
-    await orchestrator_mcp.initialize(MockMCPClient())
-    print()
-    
-    result1 = await orchestrator_mcp.delegate_task(
-        task_id="mcp-1",
-        description="Add dark mode toggle",
-        specialist="frontend-specialist",
-        file_patterns=["src/frontend/theme/**/*.ts"],
-        priority="high"
-    )
-    print()
-    print(f"Result: {result1}")
-    print()
-    
-    # Scenario 2: Without MCP (direct mode)
-    print("-" * 70)
-    print("SCENARIO 2: MCP Unavailable (Direct Mode)")
-    print("-" * 70)
-    
-    orchestrator_direct = FlexibleOrchestrator()
-    await orchestrator_direct.initialize(None)  # No MCP client
-    print()
-    
-    result2 = await orchestrator_direct.delegate_task(
-        task_id="direct-1",
-        description="Add light mode toggle",
-        specialist="frontend-specialist",
-        file_patterns=["src/frontend/theme/**/*.ts"],
-        priority="normal"
-    )
-    print()
-    print(f"Result: {result2}")
-    print()
-    
-    # Show status comparison
-    print("-" * 70)
-    print("STATUS COMPARISON")
-    print("-" * 70)
-    print("\nMCP Mode Status:")
-    print(f"  {orchestrator_mcp.get_status()}")
-    print("\nDirect Mode Status:")
-    print(f"  {orchestrator_direct.get_status()}")
-    print()
+    # Both orchestrators close their MCP clients on exit; the mail client's
+    # shared connection pool is closed once the demo is done with it
+    try:
+        async with FlexibleOrchestrator() as orchestrator_mcp, \
+                FlexibleOrchestrator() as orchestrator_direct:
+            await orchestrator_mcp.initialize(MockMCPClient())
+            print()
+            
+            result1 = await orchestrator_mcp.delegate_task(
+                task_id="mcp-1",
+                description="Add dark mode toggle",
+                specialist="frontend-specialist",
+                file_patterns=["src/frontend/theme/**/*.ts"],
+                priority="high"
+            )
+            print()
+            print(f"Result: {result1}")
+            print()
+            
+            # Scenario 2: Without MCP (direct mode)
+            print("-" * 70)
+            print("SCENARIO 2: MCP Unavailable (Direct Mode)")
+            print("-" * 70)
+            
+            await orchestrator_direct.initialize(None)  # No MCP client
+            print()
+            
+            result2 = await orchestrator_direct.delegate_task(
+                task_id="direct-1",
+                description="Add light mode toggle",
+                specialist="frontend-specialist",
+                file_patterns=["src/frontend/theme/**/*.ts"],
+                priority="normal"
+            )
+            print()
+            print(f"Result: {result2}")
+            print()
+            
+            # Show status comparison
+            print("-" * 70)
+            print("STATUS COMPARISON")
+            print("-" * 70)
+            print("\nMCP Mode Status:")
+            print(f"  {orchestrator_mcp.get_status()}")
+            print("\nDirect Mode Status:")
+            print(f"  {orchestrator_direct.get_status()}")
+            print()
+    finally:
+        await close_client()
     
     print("=" * 70)
     print("Key Insight: Same API works in both modes!")
@@ -303,4 +480,9 @@ async def main():
 
 
 if __name__ == "__main__":
+    try:
+        import uvloop  # Optional faster event loop: pip install uvloop
+        uvloop.install()
+    except ImportError:
+        pass
     asyncio.run(main())
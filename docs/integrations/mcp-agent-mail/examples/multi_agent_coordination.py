@@ -4,19 +4,59 @@ Multi-agent coordination example.
 Demonstrates: project setup, agent registration, task delegation, and coordination.
 """
 
+import re
 import sys
 import asyncio
-from datetime import datetime
+import logging
+from datetime import datetime, timezone
+from time import time
 
 sys.path.insert(0, '/Users/buddhi/.config/opencode/droids')
 
 from mcp_agent_mail_client import (
-    ensure_project,
     register_agent,
     send_message,
-    fetch_inbox,
+    stream_inbox,
     acknowledge_message,
-    get_project_key
+    get_project_key,
+    close_client
+)
+
+
+logger = logging.getLogger(__name__)
+
+_RULE = "=" * 70
+
+# Status keywords in team updates, matched in a single case-insensitive pass
+_STATUS_RE = re.compile(r"completed|progress|blocked|need help", re.IGNORECASE)
+# Status for each keyword, in priority order when several are present
+_STATUS_LABELS = (
+    ("completed", "✅ COMPLETED"),
+    ("progress", "📊 IN PROGRESS"),
+    ("blocked", "🚨 NEEDS ATTENTION"),
+    ("need help", "🚨 NEEDS ATTENTION"),
+)
+
+
+def format_ts(t):
+    """Format a Unix timestamp as ISO 8601 UTC with a trailing "Z"."""
+    return datetime.fromtimestamp(t, tz=timezone.utc).isoformat(
+        timespec="milliseconds"
+    ).replace("+00:00", "Z")
+
+
+# Feature subtasks, listed after the subtasks they depend on:
+# (task, heading, description prefix, files, priority, dependencies)
+_FEATURE_STEPS = (
+    ("design", "STEP 1: Design Phase", "Design UI/UX for",
+     ["design/wireframes/*", "design/prototypes/*"], "high", ()),
+    ("backend", "STEP 2: Backend Development", "Implement backend API for",
+     ["src/api/**/*.py", "src/models/**/*.py"], "high", ("design",)),
+    # Frontend can start after the backend API is defined
+    ("frontend", "STEP 3: Frontend Development", "Implement frontend UI for",
+     ["src/frontend/**/*"], "high", ("backend",)),
+    ("qa", "STEP 4: QA and Testing", "Test and validate",
+     ["tests/**/*", "test-results/**/*"], "normal", ("backend", "frontend")),
 )
 
 
@@ -25,7 +65,12 @@ class TeamOrchestrator:
     Orchestrator that coordinates multiple specialist agents for a complex feature.
     """
     
-    def __init__(self, mcp_client):
+    # Constant part of every task_assignment message
+    _MSG_TEMPLATE = {"version": "1.0.0", "type": "task_assignment"}
+    # Longest the mail server holds an inbox fetch open waiting for updates
+    _LONG_POLL_SECONDS = 5
+    
+    def __init__(self, mcp_client, max_concurrency=16):
         self.mcp_client = mcp_client
         self.project_key = None
         self.agent_name = "feature-orchestrator"
@@ -35,70 +80,100 @@ class TeamOrchestrator:
             "design": "design-extractor",
             "qa": "test-automator"
         }
+        # Calls currently in flight, keyed by tool and arguments
+        self._inflight = {}
+        # Bulkheads: caps on concurrent MCP calls per kind of call, so a burst
+        # of sends can't starve inbox polling/acks (or the other way round)
+        self._send_sem = asyncio.Semaphore(max_concurrency)
+        self._inbox_sem = asyncio.Semaphore(max_concurrency)
+        self._mcp_sem = asyncio.Semaphore(max_concurrency)
+
+    async def close(self):
+        """Close the MCP client (if it has a close() method)."""
+        close = getattr(self.mcp_client, "close", None)
+        if close is not None:
+            result = close()
+            if asyncio.iscoroutine(result):
+                await result
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def _mcp_call(self, coro, bulkhead):
+        """Await an MCP helper once a slot in the given bulkhead is free."""
+        try:
+            async with bulkhead:
+                return await coro
+        finally:
+            coro.close()  # No-op once awaited; avoids a never-awaited warning
+
+    async def _dedup(self, key, coro_factory):
+        """Run coro_factory() once for concurrent callers using the same key."""
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(coro_factory())
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # Shielded so one caller's cancellation does not cancel the others
+        return await asyncio.shield(future)
     
     async def setup_project(self, project_name):
         """
-        Ensure the project exists in MCP Agent Mail.
+        Resolve the MCP Agent Mail project the team works in.
+        
+        The mail client derives the project key from the repository (see
+        get_project_key) and the server creates the project on first use,
+        so there is nothing to create here.
         
         Args:
             project_name: Human-readable project name
         """
-        print("=" * 70)
-        print("Project Setup")
-        print("=" * 70)
-        
-        result = await ensure_project(
-            mcp_client=self.mcp_client,
-            human_key=project_name
-        )
+        logger.info("%s\nProject Setup\n%s", _RULE, _RULE)
         
-        if result.get("success"):
-            project = result["response"]
-            self.project_key = project["human_key"]
-            print(f"✓ Project ready: {project['slug']}")
-            print(f"  Key: {self.project_key}")
-            print(f"  Created: {project['created_at']}")
-        else:
-            raise Exception(f"Failed to setup project: {result.get('error')}")
+        self.project_key = get_project_key()
+        logger.info("✓ Project ready: %s\n  Key: %s", project_name, self.project_key)
         
         return self.project_key
     
     async def register_team(self):
         """Register all agents in the team."""
-        print()
-        print("=" * 70)
-        print("Registering Team Agents")
-        print("=" * 70)
+        logger.info("\n%s\nRegistering Team Agents\n%s", _RULE, _RULE)
         
-        # Register orchestrator
-        print(f"\nRegistering orchestrator: {self.agent_name}")
-        result = await register_agent(
-            mcp_client=self.mcp_client,
-            project_key=self.project_key,
-            agent_name=self.agent_name,
-            model="gpt-4",
-            task_description="Coordinates feature development across specialists"
+        # Register the orchestrator and every specialist concurrently
+        agents = [("orchestrator", self.agent_name,
+                   "Coordinates feature development across specialists")]
+        agents += [
+            (f"{specialty} specialist", agent_name, f"Specializes in {specialty} development")
+            for specialty, agent_name in self.team.items()
+        ]
+        results = await asyncio.gather(
+            *(self._register(agent_name, description) for _, agent_name, description in agents),
+            return_exceptions=True
         )
         
-        if result.get("success"):
-            print(f"✓ {self.agent_name} registered")
-        
-        # Register specialists
-        for specialty, agent_name in self.team.items():
-            print(f"\nRegistering {specialty} specialist: {agent_name}")
-            
-            result = await register_agent(
+        for (role, agent_name, _), result in zip(agents, results):
+            logger.info("\nRegistering %s: %s", role, agent_name)
+            if isinstance(result, Exception):
+                logger.warning("✗ %s registration failed: %s", agent_name, result)
+            elif result.get("success"):
+                logger.info("✓ %s registered", agent_name)
+                if agent_name != self.agent_name:
+                    logger.info("  Inception: %s", result['response'].get('inception_ts', 'N/A'))
+
+    async def _register(self, agent_name, description):
+        """Register one team agent (shared with any identical in-flight call)."""
+        return await self._dedup(f"register:{agent_name}", lambda: self._mcp_call(
+            register_agent(
                 mcp_client=self.mcp_client,
-                project_key=self.project_key,
                 agent_name=agent_name,
                 model="gpt-4",
-                task_description=f"Specializes in {specialty} development"
-            )
-            
-            if result.get("success"):
-                agent_info = result["response"]
-                print(f"✓ {agent_name} registered")
-                print(f"  Inception: {agent_info['inception_ts']}")
+                task_description=description
+            ),
+            self._mcp_sem
+        ))
     
     async def coordinate_feature(self, feature_id, feature_spec):
         """
@@ -108,99 +183,70 @@ class TeamOrchestrator:
             feature_id: Feature identifier (e.g., "feat-123")
             feature_spec: Complete feature specification
         """
-        print()
-        print("=" * 70)
-        print("Feature Coordination Plan")
-        print("=" * 70)
-        print()
-        print(f"Feature: {feature_spec['name']}")
-        print(f"ID: {feature_id}")
-        print(f"Description: {feature_spec['description']}")
-        print()
-        
-        # Decompose feature into subtasks
+        # Decompose feature into subtasks; nothing to coordinate without any
         tasks = feature_spec["tasks"]
-        print(f"Coordinating {len(tasks)} tasks across {len(self.team)} specialists")
-        print()
-        
-        # Step 1: Design phase
-        if "design" in tasks:
-            print("→ STEP 1: Design Phase")
-            await self._delegate_task(
-                task_id=f"{feature_id}-design",
-                description=f"Design UI/UX for: {feature_spec['name']}",
-                specialist=self.team["design"],
-                files=["design/wireframes/*", "design/prototypes/*"],
-                priority="high",
-                dependencies=[]
-            )
-            print()
-            # Wait for design completion before proceeding
-            print("⏳ Waiting for design completion...")
-            await asyncio.sleep(1)
-        
-        # Step 2: Backend development
-        if "backend" in tasks:
-            print("→ STEP 2: Backend Development")
-            backend_deps = [f"{feature_id}-design"] if "design" in tasks else []
-            await self._delegate_task(
-                task_id=f"{feature_id}-backend",
-                description=f"Implement backend API for: {feature_spec['name']}",
-                specialist=self.team["backend"],
-                files=["src/api/**/*.py", "src/models/**/*.py"],
-                priority="high",
-                dependencies=backend_deps
-            )
-            print()
+        if not tasks:
+            return
+
+        logger.info(
+            "\n%s\nFeature Coordination Plan\n%s\n\nFeature: %s\nID: %s\nDescription: %s\n",
+            _RULE, _RULE, feature_spec['name'], feature_id, feature_spec['description']
+        )
         
-        # Step 3: Frontend development (can start after backend API is defined)
-        if "frontend" in tasks:
-            print("→ STEP 3: Frontend Development")
-            frontend_deps = [f"{feature_id}-backend"] if "backend" in tasks else []
-            await self._delegate_task(
-                task_id=f"{feature_id}-frontend",
-                description=f"Implement frontend UI for: {feature_spec['name']}",
-                specialist=self.team["frontend"],
-                files=["src/frontend/**/*"],
-                priority="high",
-                dependencies=frontend_deps
-            )
-            print()
+        logger.info(
+            "Coordinating %d tasks across %d specialists\n", len(tasks), len(self.team)
+        )
         
-        # Step 4: QA and testing (can run in parallel with development)
-        if "qa" in tasks:
-            print("→ STEP 4: QA and Testing")
-            qa_deps = [f"{feature_id}-backend", f"{feature_id}-frontend"]
-            await self._delegate_task(
-                task_id=f"{feature_id}-qa",
-                description=f"Test and validate: {feature_spec['name']}",
-                specialist=self.team["qa"],
-                files=["tests/**/*", "test-results/**/*"],
-                priority="normal",
-                dependencies=qa_deps
+        # Delegate each subtask once the subtasks it depends on have been
+        # delegated; subtasks whose dependencies are met go out concurrently
+        pending = {}
+        batch_ts = format_ts(time())  # Shared by every message in this feature
+        team, delegate, name = self.team, self._delegate_task, feature_spec["name"]
+
+        async def run_step(task, heading, action, files, priority, deps):
+            if deps:
+                await asyncio.gather(*(pending[dep] for dep in deps))
+            logger.info("→ %s", heading)
+            await delegate(
+                task_id=f"{feature_id}-{task}",
+                description=f"{action}: {name}",
+                specialist=team[task],
+                files=files,
+                priority=priority,
+                dependencies=[f"{feature_id}-{dep}" for dep in deps],
+                timestamp=batch_ts
             )
-            print()
+            logger.info("")
+
+        for task, heading, action, files, priority, deps in _FEATURE_STEPS:
+            if task in tasks:
+                deps = [dep for dep in deps if dep in tasks]
+                pending[task] = asyncio.create_task(
+                    run_step(task, heading, action, files, priority, deps)
+                )
+
+        await asyncio.gather(*pending.values())
         
-        print("=" * 70)
-        print("All tasks delegated! Team is now working in parallel.")
-        print("Use fetch_inbox() to monitor progress and receive completion reports.")
-        print("=" * 70)
+        logger.info(
+            "%s\nAll tasks delegated! Team is now working in parallel.\n"
+            "Use fetch_inbox() to monitor progress and receive completion reports.\n%s",
+            _RULE, _RULE
+        )
     
     async def _delegate_task(self, task_id, description, specialist, files, priority,
-                           dependencies):
-        """Delegate a single task to a specialist."""
-        print(f"Task: {task_id}")
-        print(f"  Assigned to: {specialist}")
-        print(f"  Files: {', '.join(files[:3])}{'...' if len(files) > 3 else ''}")
-        print(f"  Priority: {priority}")
-        print(f"  Dependencies: {', '.join(dependencies) if dependencies else 'None'}")
+                           dependencies, timestamp=None):
+        """Delegate a single task to a specialist (timestamp defaults to now)."""
+        logger.info(
+            "Task: %s\n  Assigned to: %s\n  Files: %s%s\n  Priority: %s\n  Dependencies: %s",
+            task_id, specialist, ", ".join(files[:3]), "..." if len(files) > 3 else "",
+            priority, ", ".join(dependencies) if dependencies else "None"
+        )
         
         message_content = {
-            "version": "1.0.0",
-            "timestamp": datetime.utcnow().isoformat() + "Z",
+            **self._MSG_TEMPLATE,
+            "timestamp": timestamp or format_ts(time()),
             "sender_id": self.agent_name,
             "message_id": f"msg-{task_id}",
-            "type": "task_assignment",
             "task_id": task_id,
             "description": description,
             "file_patterns": files,
@@ -208,19 +254,18 @@ class TeamOrchestrator:
             "dependencies": dependencies
         }
         
-        result = await send_message(
+        result = await self._mcp_call(send_message(
             mcp_client=self.mcp_client,
-            project_key=self.project_key,
             sender_name=self.agent_name,
             recipient_name=specialist,
             content=message_content,
             importance=priority
-        )
+        ), self._send_sem)
         
         if result.get("success"):
-            print(f"  ✓ Delegated")
+            logger.info("  ✓ Delegated")
         else:
-            print(f"  ✗ Failed: {result.get('error')}")
+            logger.warning("  ✗ Failed: %s", result.get('error'))
     
     async def monitor_progress(self, duration_seconds=30):
         """
@@ -229,126 +274,123 @@ class TeamOrchestrator:
         Args:
             duration_seconds: How long to monitor (default: 30s)
         """
-        print()
-        print("=" * 70)
-        print("Monitoring Team Progress")
-        print("=" * 70)
-        print(f"Duration: {duration_seconds} seconds")
-        print()
-        
-        start_time = asyncio.get_event_loop().time()
-        
-        while (asyncio.get_event_loop().time() - start_time) < duration_seconds:
-            await self._check_team_updates()
-            await asyncio.sleep(5)
-        
-        print()
-        print("Monitoring complete!")
-    
-    async def _check_team_updates(self):
-        """Check inbox for updates from the team."""
-        result = await fetch_inbox(
-            mcp_client=self.mcp_client,
-            project_key=self.project_key,
-            agent_name=self.agent_name,
-            limit=20,
-            acknowledged_only=False
+        logger.info(
+            "\n%s\nMonitoring Team Progress\n%s\nDuration: %s seconds\n",
+            _RULE, _RULE, duration_seconds
         )
         
-        if not result.get("success"):
-            return
-        
-        messages = result["response"].get("messages", [])
-        
-        if not messages:
-            return
+        if hasattr(self.mcp_client, "subscribe_inbox"):
+            # Client pushes new messages: no polling, no idle round trips
+            updates = self._follow_team_updates(self.mcp_client.subscribe_inbox(
+                project_key=self.project_key,
+                agent_name=self.agent_name
+            ))
+        else:
+            # Long-poll: the server answers as soon as an update arrives
+            updates = self._follow_team_updates(stream_inbox(
+                self.agent_name, limit=20, wait_seconds=self._LONG_POLL_SECONDS
+            ))
         
-        print(f"📥 New updates ({len(messages)} message(s)):")
+        try:
+            await asyncio.wait_for(updates, duration_seconds)
+        except asyncio.TimeoutError:
+            pass
         
-        for msg in messages:
+        logger.info("\nMonitoring complete!")
+    
+    async def _follow_team_updates(self, messages):
+        """Process updates from the team as the messages stream yields them."""
+        async for msg in messages:
+            logger.info("📥 New update:")
             await self._process_team_update(msg)
     
     async def _process_team_update(self, msg):
         """Process an update from a team member."""
+        self._print_team_update(msg)
+        await self._ack(msg)
+        logger.info("    ✓ Acknowledged")
+    
+    def _print_team_update(self, msg):
+        """Classify and print an update from a team member."""
         subject = msg.get("subject", "")
         sender = msg.get("from", "")
         content = msg.get("content", "")
         
         # Simple classification based on content
-        if "completed" in content.lower():
-            status = "✅ COMPLETED"
-        elif "progress" in content.lower():
-            status = "📊 IN PROGRESS"
-        elif "blocked" in content.lower() or "need help" in content.lower():
-            status = "🚨 NEEDS ATTENTION"
-        else:
-            status = "💬 UPDATE"
-        
-        print(f"\n  [{status}] {sender}")
-        print(f"    Subject: {subject}")
-        print(f"    Time: {msg['created_ts'][:19]}")
+        found = {keyword.lower() for keyword in _STATUS_RE.findall(content)}
+        status = next(
+            (label for keyword, label in _STATUS_LABELS if keyword in found), "💬 UPDATE"
+        )
         
-        # Acknowledge the update
-        await acknowledge_message(
+        logger.info(
+            "\n  [%s] %s\n    Subject: %s\n    Time: %s",
+            status, sender, subject, msg['created_ts'][:19]
+        )
+    
+    async def _ack(self, msg):
+        """Acknowledge an update from a team member."""
+        return await self._mcp_call(acknowledge_message(
             mcp_client=self.mcp_client,
-            project_key=self.project_key,
             agent_name=self.agent_name,
             message_id=msg["id"]
-        )
-        print(f"    ✓ Acknowledged")
+        ), self._inbox_sem)
+
+
+class MockMCPClient:
+    """Stand-in MCP client for the demo (real usage gets one from Factory)."""
+
+    async def call_tool(self, name, arguments):
+        tool_name = arguments.get("tool_name", name)
+        print(f"   [MCP Call: {tool_name}]")
+        return {"result": {"success": True}}
+    
+    async def subscribe_inbox(self, project_key, agent_name):
+        print(f"   [MCP Subscribe: inbox of {agent_name}]")
+        # Nobody on the demo team reports back, so no update ever arrives
+        await asyncio.Event().wait()
+        yield
 
 
 # Example usage
 async def main():
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
     print("\n" + "=" * 70)
     print("Multi-Agent Coordination Demo")
     print("=" * 70)
     print()
     
-    class MockMCPClient:
-        async def call_tool(self, name, arguments):
-            tool_name = arguments.get("tool_name", name)
-            print(f"   [MCP Call: {tool_name}]")
+    # The coordinator closes its MCP client on exit; the mail client's
+    # shared connection pool is closed once the demo is done with it
+    try:
+        async with TeamOrchestrator(MockMCPClient()) as coordinator:
+            # Setup project and register team
+            project_name = "/Users/buddhi/projects/auth-feature"
+            await coordinator.setup_project(project_name)
+            await coordinator.register_team()
             
-            if tool_name == "ensure_project":
-                return {
-                    "result": {
-                        "slug": "user-auth-feature",
-                        "human_key": "/Users/buddhi/projects/auth-feature",
-                        "created_at": "2025-12-26T10:00:00Z"
-                    }
+            # Define feature specification
+            feature_spec = {
+                "name": "User Authentication with Social Login",
+                "description": "Add OAuth login with GitHub and Google",
+                "tasks": {
+                    "design": True,
+                    "backend": True,
+                    "frontend": True,
+                    "qa": True
                 }
+            }
             
-            return {"result": {"success": True}}
-    
-    mcp_client = MockMCPClient()
-    coordinator = TeamOrchestrator(mcp_client)
-    
-    # Setup project and register team
-    project_name = "/Users/buddhi/projects/auth-feature"
-    await coordinator.setup_project(project_name)
-    await coordinator.register_team()
-    
-    # Define feature specification
-    feature_spec = {
-        "name": "User Authentication with Social Login",
-        "description": "Add OAuth login with GitHub and Google",
-        "tasks": {
-            "design": True,
-            "backend": True,
-            "frontend": True,
-            "qa": True
-        }
-    }
-    
-    # Coordinate feature development
-    await coordinator.coordinate_feature(
-        feature_id="feat-auth-001",
-        feature_spec=feature_spec
-    )
-    
-    # Monitor progress for a few seconds
-    await coordinator.monitor_progress(duration_seconds=5)
+            # Coordinate feature development
+            await coordinator.coordinate_feature(
+                feature_id="feat-auth-001",
+                feature_spec=feature_spec
+            )
+            
+            # Monitor progress for a few seconds
+            await coordinator.monitor_progress(duration_seconds=5)
+    finally:
+        await close_client()
     
     print()
     print("=" * 70)
@@ -361,4 +403,9 @@ async def main():
 
 
 if __name__ == "__main__":
+    try:
+        import uvloop  # Optional faster event loop: pip install uvloop
+        uvloop.install()
+    except ImportError:
+        pass
     asyncio.run(main())
@@ -4,13 +4,21 @@ Orchestrator droid that delegates tasks to specialists via MCP Agent Mail.
 Demonstrates: registration, task delegation, and receiving completion reports.
 """
 
+import os
 import sys
 import asyncio
+import fnmatch
+import functools
+import hashlib
+import logging
+import time
 import uuid
-from datetime import datetime
+from dataclasses import dataclass, field
 
-# Add Factory droids to path
-sys.path.insert(0, '/Users/buddhi/.config/opencode/droids')
+# Add Factory droids to path (once; override with OPENCODE_DROIDS_DIR)
+DROIDS_DIR = os.environ.get("OPENCODE_DROIDS_DIR", "/Users/buddhi/.config/opencode/droids")
+if DROIDS_DIR not in sys.path:
+    sys.path.insert(0, DROIDS_DIR)
 
 from mcp_agent_mail_client import (
     register_agent,
@@ -20,12 +28,110 @@ from mcp_agent_mail_client import (
     get_project_key
 )
 
+logger = logging.getLogger(__name__)
+
+# (second, "YYYY-MM-DDTHH:MM:SS") of the last timestamp _utcnow_iso() formatted
+_ts_second = (None, "")
+
+# bd priority value (0-3) -> message priority/importance name
+_PRIORITY_NAMES = ("high", "high", "normal", "normal")
+
 # Message format helpers
 # Note: MESSAGE_FORMATS is available via droids/ path already in sys.path
 # from MESSAGE_FORMATS import TaskAssignment, TaskCompletion
 
 
+def _utcnow_iso():
+    """
+    Current UTC time as ISO 8601 with microseconds and a trailing "Z".
+
+    The date/time part is only reformatted when the second changes, so a
+    burst of delegations pays for a single strftime.
+    """
+    global _ts_second
+    second, nanos = divmod(time.time_ns(), 1_000_000_000)
+    if _ts_second[0] != second:
+        _ts_second = (second, time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(second)))
+    return f"{_ts_second[1]}.{nanos // 1000:06d}Z"
+
+
+@functools.lru_cache(maxsize=256)
+def _file_patterns_spec(file_patterns):
+    """
+    Return (hash, regex) for a tuple of file glob patterns.
+
+    regex is the patterns translated into one regular expression, so a
+    specialist can compile it once per hash instead of once per message.
+    """
+    if not file_patterns:
+        return "", ""
+    digest = hashlib.blake2b("\n".join(file_patterns).encode(), digest_size=16).hexdigest()
+    return digest, "|".join(fnmatch.translate(pattern) for pattern in file_patterns)
+
+
+def _default_specification():
+    return {
+        "acceptance_criteria": [
+            "Code follows project style guidelines",
+            "All tests pass",
+            "Documentation updated if needed"
+        ],
+        "technical_requirements": [
+            "Use existing libraries and patterns",
+            "Follow coding guidelines from AGENTS.md"
+        ]
+    }
+
+
+def _default_metadata():
+    return {"labels": ["automated", "delegated"], "component": "mcp-integration"}
+
+
+@dataclass(slots=True)
+class TaskAssignment:
+    """Content of a task_assignment message."""
+    task_id: str
+    description: str
+    sender_id: str
+    file_patterns: list = field(default_factory=list)
+    file_patterns_hash: str = ""
+    file_patterns_regex: str = ""
+    priority: str = "normal"
+    priority_value: int = 2
+    estimated_duration_minutes: int = 120
+    specification: dict = field(default_factory=_default_specification)
+    metadata: dict = field(default_factory=_default_metadata)
+    version: str = "1.0.0"
+    type: str = "task_assignment"
+    timestamp: str = field(default_factory=_utcnow_iso)
+    message_id: str = field(default_factory=lambda: f"msg-{uuid.uuid4()}")
+
+    def to_content(self):
+        """
+        Return the message content dict.
+
+        Unlike asdict(), nested values are shared with the instance instead
+        of deep-copied; the content is only serialized for sending.
+        """
+        # With slots=True, __slots__ lists the fields in declaration order
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+def _is_completion_report(msg):
+    """Whether an inbox message is a task completion report."""
+    msg_type = msg.get("type")
+    if msg_type is not None:
+        return msg_type == "task_completion"
+    # Server did not set the message type: look inside the message instead
+    return (
+        "task_completion" in msg.get("content", "")
+        or "completed" in msg.get("subject", "").lower()
+    )
+
+
 class Orchestrator:
+    __slots__ = ("mcp_client", "project_key", "agent_name", "use_mcp")
+
     def __init__(self, mcp_client):
         self.mcp_client = mcp_client
         self.project_key = get_project_key()
@@ -37,7 +143,6 @@ class Orchestrator:
         try:
             result = await register_agent(
                 mcp_client=self.mcp_client,
-                project_key=self.project_key,
                 agent_name=self.agent_name,
                 model="gpt-4",
                 task_description="Coordinates tasks between specialist droids"
@@ -46,19 +151,23 @@ class Orchestrator:
             if result["success"]:
                 self.use_mcp = True
                 agent_info = result["response"]
-                print(f"✓ Registered as agent: {agent_info['name']}")
-                print(f"  Session started at: {agent_info['inception_ts']}")
+                logger.info(
+                    "✓ Registered as agent: %s\n  Session started at: %s",
+                    agent_info["name"], agent_info["inception_ts"]
+                )
             else:
-                print(f"⚠ Registration failed: {result.get('error', 'Unknown error')}")
-                print("→ Will use direct execution mode")
+                logger.warning(
+                    "⚠ Registration failed: %s\n→ Will use direct execution mode",
+                    result.get("error", "Unknown error")
+                )
                 
         except Exception as e:
-            print(f"⚠ MCP Agent Mail unavailable: {e}")
-            print("→ Will use direct execution mode")
+            logger.warning("⚠ MCP Agent Mail unavailable: %s\n→ Will use direct execution mode", e)
             
         return self.use_mcp
     
-    async def delegate_task(self, task_id, description, specialist, file_patterns):
+    async def delegate_task(self, task_id, description, specialist, file_patterns=(),
+                            priority=1):
         """
         Delegate a task to a specialist droid.
         
@@ -67,64 +176,111 @@ class Orchestrator:
             description: Human-readable task description
             specialist: Name of specialist agent (e.g., "frontend-specialist")
             file_patterns: List of file patterns affected
+            priority: bd priority value, 0 (highest) to 3 (default: 1)
         """
         if not self.use_mcp:
-            print(f"⚠ MCP not enabled, running task {task_id} directly...")
+            logger.warning("⚠ MCP not enabled, running task %s directly...", task_id)
             return await self._run_task_directly(task_id, description)
         
-        # Create task assignment message
-        message_content = {
-            "version": "1.0.0",
-            "timestamp": datetime.utcnow().isoformat() + "Z",
-            "sender_id": self.agent_name,
-            "message_id": f"msg-{uuid.uuid4()}",
-            "type": "task_assignment",
-            "task_id": task_id,
-            "description": description,
-            "specification": {
-                "acceptance_criteria": [
-                    "Code follows project style guidelines",
-                    "All tests pass",
-                    "Documentation updated if needed"
-                ],
-                "technical_requirements": [
-                    "Use existing libraries and patterns",
-                    "Follow coding guidelines from AGENTS.md"
-                ]
-            },
-            "file_patterns": file_patterns,
-            "priority": "high",
-            "priority_value": 1,
-            "estimated_duration_minutes": 120,
-            "metadata": {
-                "labels": ["automated", "delegated"],
-                "component": "mcp-integration"
-            }
-        }
-        
-        print(f"→ Delegating {task_id} to {specialist}...")
-        print(f"  Description: {description}")
-        print(f"  Files: {', '.join(file_patterns)}")
+        assignment = self._build_task_assignment(
+            task_id, description, file_patterns, priority
+        )
+
+        logger.info(
+            "→ Delegating %s to %s...\n  Description: %s\n  Files: %s",
+            task_id, specialist, description, ", ".join(file_patterns)
+        )
         
         result = await send_message(
             mcp_client=self.mcp_client,
-            project_key=self.project_key,
             sender_name=self.agent_name,
             recipient_name=specialist,
-            content=message_content,
-            importance="high"
+            content=assignment.to_content(),
+            importance=assignment.priority
         )
         
         if result["success"]:
             delivery = result["response"]
-            print(f"✓ Task delegated successfully")
-            print(f"  Delivered to: {delivery['recipients']}")
-            print(f"  Thread ID: {delivery.get('thread_id', 'N/A')}")
+            logger.info(
+                "✓ Task delegated successfully\n  Delivered to: %s\n  Thread ID: %s",
+                delivery["recipients"], delivery.get("thread_id", "N/A")
+            )
             return True
         else:
-            print(f"✗ Delegation failed: {result.get('error')}")
+            logger.warning("✗ Delegation failed: %s", result.get("error"))
             return False
     
+    def _build_task_assignment(self, task_id, description, file_patterns, priority=1):
+        """Build the TaskAssignment for a single task."""
+        file_patterns = tuple(file_patterns)
+        patterns_hash, patterns_regex = _file_patterns_spec(file_patterns)
+        return TaskAssignment(
+            task_id=task_id,
+            description=description,
+            sender_id=self.agent_name,
+            file_patterns=list(file_patterns),
+            file_patterns_hash=patterns_hash,
+            file_patterns_regex=patterns_regex,
+            priority=_PRIORITY_NAMES[max(0, min(priority, 3))],
+            priority_value=priority
+        )
+
+    async def delegate_tasks(self, tasks, max_in_flight=16):
+        """
+        Delegate a batch of tasks to specialist droids concurrently.
+
+        All task assignment messages are built up front, then sent together
+        with at most max_in_flight sends outstanding at once.
+
+        Args:
+            tasks: List of dicts with "task_id", "description", "specialist"
+                and optional "file_patterns"/"priority" keys (same as
+                delegate_task arguments)
+            max_in_flight: Maximum number of concurrent sends (default: 16)
+
+        Returns:
+            Dict mapping task_id to True/False delivery status (or the
+            direct-run result when MCP is not enabled)
+        """
+        if not self.use_mcp:
+            return {
+                task["task_id"]: await self.delegate_task(**task)
+                for task in tasks
+            }
+
+        semaphore = asyncio.Semaphore(max_in_flight)
+
+        async def send_one(task):
+            assignment = self._build_task_assignment(
+                task["task_id"], task["description"],
+                task.get("file_patterns", ()), task.get("priority", 1)
+            )
+            async with semaphore:
+                return await send_message(
+                    mcp_client=self.mcp_client,
+                    sender_name=self.agent_name,
+                    recipient_name=task["specialist"],
+                    content=assignment.to_content(),
+                    importance=assignment.priority
+                )
+
+        outcomes = await asyncio.gather(
+            *(send_one(task) for task in tasks), return_exceptions=True
+        )
+
+        results = {}
+        for task, outcome in zip(tasks, outcomes):
+            if isinstance(outcome, Exception):
+                outcome = {"success": False, "error": str(outcome)}
+            results[task["task_id"]] = outcome["success"]
+            if not outcome["success"]:
+                logger.warning(
+                    "✗ Delegation of %s failed: %s", task["task_id"], outcome.get("error")
+                )
+
+        logger.info("✓ Delegated %d/%d task(s)", sum(results.values()), len(tasks))
+        return results
+
     async def check_completion_reports(self):
         """Check inbox for task completion reports from specialists."""
         if not self.use_mcp:
@@ -132,52 +288,57 @@ class Orchestrator:
         
         result = await fetch_inbox(
             mcp_client=self.mcp_client,
-            project_key=self.project_key,
             agent_name=self.agent_name,
-            limit=20,
-            acknowledged_only=False
+            limit=20
         )
         
         if not result["success"]:
-            print(f"⚠ Failed to fetch inbox: {result.get('error')}")
+            logger.warning("⚠ Failed to fetch inbox: %s", result.get("error"))
             return []
         
         messages = result["response"].get("messages", [])
         completion_reports = []
         
         for msg in messages:
-            content = msg.get("content", "")
             subject = msg.get("subject", "")
             
             # Look for task completion messages
-            if "task_completion" in content or "completed" in subject.lower():
-                print(f"\n📥 Task completion report:")
-                print(f"   From: {msg['from']}")
-                print(f"   Subject: {subject}")
-                print(f"   Received: {msg['created_ts']}")
+            if _is_completion_report(msg):
+                logger.info(
+                    "\n📥 Task completion report:\n   From: %s\n   Subject: %s\n   Received: %s",
+                    msg["from"], subject, msg["created_ts"]
+                )
                 
                 completion_reports.append(msg)
-                
-                # Acknowledge the message
-                await acknowledge_message(
+        
+        if completion_reports:
+            # Acknowledge all reports at once; one failed ack doesn't stop the rest
+            acks = await asyncio.gather(*(
+                acknowledge_message(
                     mcp_client=self.mcp_client,
-                    project_key=self.project_key,
                     agent_name=self.agent_name,
                     message_id=msg["id"]
                 )
-                print("   ✓ Acknowledged")
+                for msg in completion_reports
+            ), return_exceptions=True)
+            acked = sum(
+                not isinstance(ack, Exception) and ack.get("success", False) for ack in acks
+            )
+            logger.info("   ✓ Acknowledged %d/%d report(s)", acked, len(completion_reports))
         
         return completion_reports
     
     async def _run_task_directly(self, task_id, description):
         """Fallback: run task directly without MCP."""
-        print(f"   Running directly: {description}")
+        logger.info("   Running directly: %s", description)
         # In a real scenario, you'd execute the task logic here
         return {"status": "complete_direct", "task_id": task_id}
 
 
 # Example usage
 async def main():
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
     print("=" * 60)
     print("Orchestrator Task Delegation Demo")
     print("=" * 60)
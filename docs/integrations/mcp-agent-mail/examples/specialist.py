@@ -4,35 +4,104 @@ Specialist droid that processes tasks from its inbox.
 Demonstrates: inbox polling, message processing, and acknowledgment.
 """
 
+import os
+import re
 import sys
 import asyncio
+import fnmatch
+import logging
 import time
+from collections import OrderedDict
 from datetime import datetime
 
+try:
+    from orjson import loads as _loads  # Optional: faster JSON parsing
+except ImportError:
+    from json import loads as _loads
+
 sys.path.insert(0, '/Users/buddhi/.config/opencode/droids')
 
 from mcp_agent_mail_client import (
     register_agent,
     fetch_inbox,
-    acknowledge_message,
-    get_project_key
+    MCPBatcher
 )
 
+logger = logging.getLogger(__name__)
+
+# Message type -> (log level, type label, what the specialist does with it);
+# types without an entry in Specialist._HANDLERS are only logged
+_MESSAGE_KINDS = {
+    "task_assignment": (logging.INFO, "📋 Type: Task Assignment", "Processing task..."),
+    "task_completion": (
+        logging.INFO, "✅ Type: Task Completion Report", "Noting completion for tracking..."
+    ),
+    "status_update": (logging.INFO, "📊 Type: Status Update", "Tracking progress..."),
+    "error_report": (logging.WARNING, "❌ Type: Error Report", "Alert: Error needs attention!"),
+}
+_GENERIC_KIND = (logging.INFO, "💬 Type: Generic Message", "Noting message content...")
+
+
+# Compiled file pattern regexes by the orchestrator's file_patterns_hash,
+# least recently used first
+_PATTERN_CACHE_SIZE = 256
+_pattern_cache = OrderedDict()
+
+
+def _compile_file_patterns(patterns_hash, patterns_regex, file_patterns):
+    """
+    Compile a task's file pattern regex, cached by the orchestrator's hash.
+
+    The cache is keyed on the hash alone, so the regex and pattern list are
+    only used on a miss. Falls back to translating file_patterns here when
+    the regex uses syntax this Python's re module lacks (it was built by the
+    orchestrator's Python).
+    """
+    compiled = _pattern_cache.get(patterns_hash)
+    if compiled is not None:
+        _pattern_cache.move_to_end(patterns_hash)
+        return compiled
+    
+    try:
+        compiled = re.compile(patterns_regex)
+    except re.error:
+        compiled = re.compile("|".join(fnmatch.translate(pattern) for pattern in file_patterns))
+    
+    if patterns_hash:
+        _pattern_cache[patterns_hash] = compiled
+        if len(_pattern_cache) > _PATTERN_CACHE_SIZE:
+            _pattern_cache.popitem(last=False)
+    return compiled
+
 
 class Specialist:
+    # How many processed message IDs to remember for dropping re-deliveries
+    _SEEN_LIMIT = 10_000
+    # Messages are handled by this many workers; fetching pauses while
+    # the work queue is full
+    _WORKERS = 4
+    _QUEUE_SIZE = 64
+    
     def __init__(self, mcp_client, agent_name):
         self.mcp_client = mcp_client
-        self.project_key = get_project_key()
         self.agent_name = agent_name
         self.use_mcp = False
         self.is_running = False
+        self._new_mail = None  # asyncio.Event, created by the running processor
+        self._processor_done = None  # asyncio.Event, set when the processor exits
+        self._fetch = None  # Inbox fetch in flight, cancelled on stop
+        self._seen = OrderedDict()  # Processed message IDs, oldest first
+        self._queued = set()  # IDs of messages waiting for or held by a worker
+        self._work_q = None
+        self._workers = []
+        # Acks from workers finishing close together go out as one batch
+        self._acks = MCPBatcher(max_batch=self._WORKERS)
         
     async def initialize(self):
         """Register with MCP Agent Mail."""
         try:
             result = await register_agent(
                 mcp_client=self.mcp_client,
-                project_key=self.project_key,
                 agent_name=self.agent_name,
                 model="gpt-4",
                 task_description=f"Specialist agent: {self.agent_name}"
@@ -40,12 +109,13 @@ class Specialist:
             
             self.use_mcp = result.get("success", False)
             if self.use_mcp:
-                print(f"✓ {self.agent_name} registered and ready")
+                self._start_workers()
+                logger.info("✓ %s registered and ready", self.agent_name)
             else:
-                print(f"⚠ {self.agent_name} using direct mode")
+                logger.warning("⚠ %s using direct mode", self.agent_name)
                 
         except Exception as e:
-            print(f"⚠ {self.agent_name} initialization failed: {e}")
+            logger.warning("⚠ %s initialization failed: %s", self.agent_name, e)
         
         return self.use_mcp
     
@@ -53,133 +123,233 @@ class Specialist:
         """
         Start the inbox processing loop.
         
+        Each fetch long-polls: the server holds it for up to
+        check_interval_seconds until a message arrives. If the fetch returns
+        early without any new messages (e.g. only ones still being worked on,
+        or the server lacks long-poll support), the processor waits out the
+        rest of the interval, or until notify_new_mail() is called.
+        
         Args:
-            check_interval_seconds: How often to check inbox (default: 10s)
+            check_interval_seconds: Longest wait between checks (default: 10s)
         """
         if not self.use_mcp:
-            print(f"⚠ {self.agent_name} not using MCP, inbox processor not started")
+            logger.warning("⚠ %s not using MCP, inbox processor not started", self.agent_name)
             return
         
         self.is_running = True
-        print(f"→ Starting inbox processor for {self.agent_name} (checking every {check_interval_seconds}s)")
+        # Created here so it belongs to the loop the processor runs in
+        self._new_mail = asyncio.Event()
+        self._processor_done = asyncio.Event()
+        logger.info(
+            "→ Starting inbox processor for %s (long-polling, up to %ss per fetch)",
+            self.agent_name, check_interval_seconds
+        )
         
-        while self.is_running:
-            try:
-                await self._process_inbox()
-                await asyncio.sleep(check_interval_seconds)
-            except Exception as e:
-                print(f"✗ Inbox processing error: {e}")
-                await asyncio.sleep(check_interval_seconds * 2)  # Back off on errors
+        try:
+            while self.is_running:
+                try:
+                    started = time.monotonic()
+                    if not await self._process_inbox(wait_seconds=check_interval_seconds):
+                        remaining = check_interval_seconds - (time.monotonic() - started)
+                        if remaining > 0:
+                            await self._wait_for_mail(remaining)
+                except Exception as e:
+                    logger.warning("✗ Inbox processing error: %s", e)
+                    await self._wait_for_mail(check_interval_seconds * 2)  # Back off on errors
+        finally:
+            self._processor_done.set()
+    
+    def notify_new_mail(self):
+        """Wake the inbox processor now (e.g. from a push notification handler)."""
+        if self._new_mail is not None:
+            self._new_mail.set()
+    
+    async def _wait_for_mail(self, timeout):
+        """Wait until notify_new_mail() is called or timeout seconds pass."""
+        try:
+            await asyncio.wait_for(self._new_mail.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._new_mail.clear()
     
     async def stop_inbox_processor(self):
-        """Stop the inbox processing loop."""
+        """Stop the inbox processing loop once the queued messages are handled."""
         self.is_running = False
-        print(f"→ Stopping inbox processor for {self.agent_name}")
+        self.notify_new_mail()  # Don't sit out the rest of the wait
+        if self._fetch is not None:
+            self._fetch.cancel()  # Nor the rest of a long-poll
+        logger.info("→ Stopping inbox processor for %s", self.agent_name)
+        
+        # The processor may still be queueing what its last fetch returned,
+        # so let it exit before draining the queue and cancelling the workers
+        if self._processor_done is not None:
+            await self._processor_done.wait()
+        if self._work_q is not None:
+            await self._work_q.join()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        await self._acks.close()
     
-    async def _process_inbox(self):
-        """Check inbox and process any new messages."""
-        result = await fetch_inbox(
+    def _start_workers(self):
+        """Start the workers that process queued messages (in the running loop)."""
+        if self._workers:
+            return
+        self._work_q = asyncio.Queue(maxsize=self._QUEUE_SIZE)
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self._WORKERS)]
+    
+    async def _worker(self):
+        """Process and acknowledge queued messages, one at a time."""
+        while True:
+            msg = await self._work_q.get()
+            try:
+                await self._process_message(msg)
+                await self._acks.acknowledge_message(self.agent_name, msg["id"])
+                logger.info("  ✓ Acknowledged message %s", msg["id"])
+            except Exception as e:
+                # Left unacknowledged, so it is fetched and retried later
+                logger.warning("✗ Failed to process message %s: %s", msg.get("id"), e)
+            finally:
+                self._queued.discard(msg.get("id"))
+                self._work_q.task_done()
+    
+    async def _process_inbox(self, wait_seconds=0):
+        """
+        Check inbox and queue any new messages for the workers.
+        
+        Args:
+            wait_seconds: Let the server hold the fetch this long for mail
+        
+        Returns:
+            True if any new messages were queued (not ones already queued or
+            being worked on, which the server keeps returning until acked)
+        """
+        if self._work_q is None:
+            return False  # Workers only run once registered with MCP
+        
+        self._fetch = asyncio.ensure_future(fetch_inbox(
             mcp_client=self.mcp_client,
-            project_key=self.project_key,
             agent_name=self.agent_name,
             limit=50,
-            acknowledged_only=False  # Get all messages, including unacknowledged
-        )
+            wait_seconds=wait_seconds
+        ))
+        try:
+            result = await self._fetch
+        except asyncio.CancelledError:
+            if self.is_running or not self._fetch.cancelled():
+                raise
+            return False  # Cancelled by stop_inbox_processor()
+        finally:
+            self._fetch = None
         
         if not result["success"]:
-            print(f"⚠ Failed to fetch inbox: {result.get('error')}")
-            return
+            logger.warning("⚠ Failed to fetch inbox: %s", result.get("error"))
+            return False
         
         messages = result["response"].get("messages", [])
         
         if not messages:
-            return  # No messages to process
+            return False  # No messages to process
         
-        print(f"\n📥 {self.agent_name} has {len(messages)} message(s)")
+        logger.info("\n📥 %s has %d message(s)", self.agent_name, len(messages))
         
+        # Hand messages to the workers; waits here while the queue is full
+        queued = False
         for msg in messages:
-            await self._process_message(msg)
+            if msg["id"] not in self._queued:  # Not still being handled
+                self._queued.add(msg["id"])
+                await self._work_q.put(msg)
+                queued = True
+        return queued
     
     async def _process_message(self, msg):
-        """Process a single message based on its type."""
+        """Process a single message based on its type (acknowledged by the worker)."""
         message_id = msg.get("id")
-        subject = msg.get("subject", "")
-        content = msg.get("content", "")
+        if message_id in self._seen:
+            # Re-delivered (e.g. its ack was lost): acknowledge again, don't re-run
+            self._seen.move_to_end(message_id)
+            logger.info("\n  ↺ Message %s already processed, skipping", message_id)
+            return
+        
         sender = msg.get("from")
-        importance = msg.get("importance", "normal")
-        
-        print(f"\n  Message from: {sender}")
-        print(f"  Subject: {subject}")
-        print(f"  Importance: {importance}")
-        print(f"  Received: {msg['created_ts']}")
-        
-        # Determine message type and process accordingly
-        if "task_assignment" in content:
-            await self._handle_task_assignment(msg)
-        elif "task_completion" in content:
-            await self._handle_task_completion(msg)
-        elif "status_update" in content:
-            await self._handle_status_update(msg)
-        elif "error_report" in content:
-            await self._handle_error_report(msg)
-        else:
-            await self._handle_generic_message(msg)
-        
-        # Always acknowledge after processing
-        await acknowledge_message(
-            mcp_client=self.mcp_client,
-            project_key=self.project_key,
-            agent_name=self.agent_name,
-            message_id=message_id
+        
+        # Parse the content once and dispatch on the message type, as set by
+        # the server or else as found in the content
+        parsed = self._parse_content(msg.get("content", ""))
+        msg_type = msg.get("type") or parsed.get("type")
+        level, label, action = _MESSAGE_KINDS.get(msg_type, _GENERIC_KIND)
+        logger.log(
+            level,
+            "\n  Message from: %s\n  Subject: %s\n  Importance: %s\n  Received: %s\n  %s\n  %s",
+            sender, msg.get("subject", ""), msg.get("importance", "normal"),
+            msg["created_ts"], label, action,
+            extra={"message_id": message_id, "sender": sender, "msg_type": msg_type}
         )
-        print(f"  ✓ Acknowledged")
-    
-    async def _handle_task_assignment(self, msg):
-        """Handle a task assignment message."""
-        content = msg.get("content", "")
         
-        print(f"  📋 Type: Task Assignment")
+        handler = self._HANDLERS.get(msg_type)
+        if handler is not None:
+            await handler(self, msg, parsed)
         
-        # Extract task details from content
-        # In real usage, you'd parse the JSON content
-        print(f"  Processing task...")
+        self._seen[message_id] = None
+        if len(self._seen) > self._SEEN_LIMIT:
+            self._seen.popitem(last=False)
+    
+    @staticmethod
+    def _parse_content(content):
+        """Return message content as a dict ({} if it is not a JSON object)."""
+        if isinstance(content, (str, bytes)):
+            try:
+                content = _loads(content) if content else {}
+            except ValueError:
+                return {}
+        return content if isinstance(content, dict) else {}
+    
+    @staticmethod
+    def task_scope(parsed):
+        """
+        Return the compiled pattern for the files a task assignment may touch.
+        
+        Uses the regex the orchestrator sent with the assignment, falling back
+        to the raw globs for older orchestrators. None if the task lists none.
         
+        Note: the regex is taken from an inbound message and compiled as is,
+        so only process assignments from trusted senders.
+        """
+        file_patterns = parsed.get("file_patterns") or ()
+        patterns_regex = parsed.get("file_patterns_regex")
+        if not patterns_regex:
+            if not file_patterns:
+                return None
+            patterns_regex = "|".join(fnmatch.translate(pattern) for pattern in file_patterns)
+        return _compile_file_patterns(
+            parsed.get("file_patterns_hash"), patterns_regex, tuple(file_patterns)
+        )
+    
+    async def _handle_task_assignment(self, msg, parsed):
+        """Handle a task assignment message (details, e.g. task_id, in parsed)."""
         # Simulate task processing
         await asyncio.sleep(2)
         
         # In a real scenario:
-        # 1. Parse the task details
+        # 1. Read the task details
         # 2. Validate acceptance criteria
-        # 3. Reserve required files
+        # 3. Reserve required files (those where self.task_scope(parsed).match(path))
         # 4. Do the work
         # 5. Send completion report
         
-        print(f"  ✓ Task accepted and queued for processing")
-    
-    async def _handle_task_completion(self, msg):
-        """Handle a task completion report."""
-        print(f"  ✅ Type: Task Completion Report")
-        print(f"  Noting completion for tracking...")
+        logger.info("  ✓ Task accepted and queued for processing")
     
-    async def _handle_status_update(self, msg):
-        """Handle a status update message."""
-        print(f"  📊 Type: Status Update")
-        print(f"  Tracking progress...")
-    
-    async def _handle_error_report(self, msg):
-        """Handle an error report."""
-        print(f"  ❌ Type: Error Report")
-        content = msg.get("content", "")
-        print(f"  Alert: Error needs attention!")
-    
-    async def _handle_generic_message(self, msg):
-        """Handle generic/unrecognized messages."""
-        print(f"  💬 Type: Generic Message")
-        print(f"  Noting message content...")
+    # Message type -> handler, for the types that need more than logging
+    _HANDLERS = {
+        "task_assignment": _handle_task_assignment,
+    }
 
 
 # Example usage
 async def main():
+    logging.basicConfig(level=os.environ.get("MCP_LOG", "INFO"), format="%(message)s")
+
     print("=" * 60)
     print("Specialist Inbox Processor Demo")
     print("=" * 60)
@@ -223,8 +393,11 @@ async def main():
     await specialist.initialize()
     print()
     
-    # Process inbox once (normally runs continuously)
+    # Process inbox once (normally runs continuously) and let the workers
+    # finish the fetched messages
     await specialist._process_inbox()
+    if specialist.use_mcp:
+        await specialist._work_q.join()
     print()
     
     print("=" * 60)
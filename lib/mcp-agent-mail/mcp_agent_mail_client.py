@@ -9,10 +9,13 @@ Usage in opencode agents:
         register_agent,
         send_message,
         fetch_inbox,
+        stream_inbox,
         acknowledge_message,
         reserve_file_paths,
         release_file_reservations,
-        get_project_key
+        get_project_key,
+        is_mcp_available,
+        close_client
     )
 
 # Register agent
@@ -30,17 +33,91 @@ result = await send_message(
 )
 """
 
+import asyncio
+import functools
 import json
 import os
-import requests
-from typing import Dict, Any, Optional
+import random
+import re
+import shutil
+import subprocess
+import time
+import uuid
+import httpx
+from collections import OrderedDict
+from dataclasses import asdict, is_dataclass
+from typing import Dict, Any, AsyncIterator, Optional, TypedDict
 from pathlib import Path
 
+try:
+    import orjson
+
+    _dumps = orjson.dumps
+    _loads = orjson.loads
+except ImportError:  # orjson is optional; fall back to the stdlib
+    def _dumps(obj: Any) -> bytes:
+        return json.dumps(obj).encode("utf-8")
+
+    _loads = json.loads
+
 
 # MCP Agent Mail server configuration
 MCP_AGENT_MAIL_HOST = "127.0.0.1"
 MCP_AGENT_MAIL_PORT = 8765
 MCP_BASE_URL = f"http://{MCP_AGENT_MAIL_HOST}:{MCP_AGENT_MAIL_PORT}"
+# Unix domain socket the server may also listen on; used instead of loopback
+# TCP whenever it exists (override with MCP_AGENT_MAIL_SOCKET)
+MCP_AGENT_MAIL_SOCKET = os.environ.get("MCP_AGENT_MAIL_SOCKET", "/run/mcp-agent-mail.sock")
+
+_JSON_HEADERS = {"Content-Type": "application/json"}
+
+# Connection pool for the shared client: idle loopback connections are kept
+# open for a minute so bursts of sends/acks reuse them instead of reconnecting
+_POOL_LIMITS = httpx.Limits(
+    max_connections=32,
+    max_keepalive_connections=16,
+    keepalive_expiry=60
+)
+
+# Fail fast on a dead server (connect) without cutting off slow replies
+_CONNECT_TIMEOUT = 0.5
+_TIMEOUT = httpx.Timeout(5, connect=_CONNECT_TIMEOUT)
+
+# GETs are idempotent, so they are retried (with jittered exponential backoff)
+# on transport errors and on these gateway/unavailable statuses
+_GET_ATTEMPTS = 3
+_RETRY_STATUSES = frozenset({502, 503, 504})
+
+# One async client (and keep-alive connection pool) shared by every helper;
+# created on first use and bound to the event loop it was created in
+_client: Optional[httpx.AsyncClient] = None
+_client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+# Resolved once; None when git is not installed
+_GIT = shutil.which("git")
+
+# Body of a [remote "origin"] section in a .git/config file, up to the
+# next section header
+_ORIGIN_SECTION_RE = re.compile(
+    r'^\s*\[(?i:remote)\s+"origin"\]\s*$((?:(?!^\s*\[).)*)',
+    re.MULTILINE | re.DOTALL
+)
+
+# url = ... line in a section body; captures the raw value up to the end
+# of the line (see _config_value)
+_URL_LINE_RE = re.compile(r'^\s*(?i:url)[ \t]*=([^\n]*)', re.MULTILINE)
+
+# Backslash escapes git config understands inside values
+_CONFIG_ESCAPES = {"n": "\n", "t": "\t", "b": "\b"}
+
+# How many message IDs stream_inbox() remembers for dropping repeats
+_STREAM_SEEN_LIMIT = 10_000
+
+# Namespace for the UUIDv5 idempotency keys attached to sent messages
+_IDEMPOTENCY_NS = uuid.uuid5(uuid.NAMESPACE_URL, "mcp-agent-mail/idempotency")
+
+# Result of the server probe in is_mcp_available(); None until first checked
+_MCP_AVAILABLE: Optional[bool] = None
 
 
 def get_project_key() -> str:
@@ -48,35 +125,286 @@ def get_project_key() -> str:
     Get project key for current directory.
 
     Returns git repo slug or current working directory.
+    The result is cached per working directory, so git is only run once.
     """
-    try:
-        import subprocess
-        # Try to get git remote URL
-        result = subprocess.run(
-            ["git", "config", "--get", "remote.origin.url"],
-            capture_output=True,
-            text=True,
-            cwd=os.getcwd()
-        )
-        if result.returncode == 0:
-            git_url = result.stdout.strip()
-            # Extract repo slug from URL
-            # Example: https://github.com/user/repo.git -> user/repo
-            repo_slug = git_url.split("/")[-2:]
+    return _project_key_for(os.getcwd())
+
+
+@functools.lru_cache(maxsize=8)
+def _project_key_for(cwd: str) -> str:
+    """Resolve the project key for cwd (cached by get_project_key)."""
+    git_url = _read_origin_url(cwd)
+    if git_url is None and _GIT is not None:
+        try:
+            # Try to get git remote URL
+            result = subprocess.run(
+                [_GIT, "config", "--get", "remote.origin.url"],
+                capture_output=True,
+                text=True,
+                cwd=cwd
+            )
+            if result.returncode == 0:
+                git_url = result.stdout.strip()
+        except Exception:
+            pass
+
+    if git_url:
+        # Extract repo slug from URL
+        # Example: https://github.com/user/repo.git -> user/repo
+        repo_slug = git_url.split("/")[-2:]
+        if len(repo_slug) == 2:
             return f"{repo_slug[0]}/{repo_slug[1]}".replace(".git", "")
-    except Exception:
-        pass
 
     # Fallback to current directory name
-    return Path(os.getcwd()).name
+    return Path(cwd).name
+
+
+def _read_origin_url(cwd: str) -> Optional[str]:
+    """
+    Read remote.origin.url straight from the repository's .git/config.
+
+    Returns None when no .git directory is found above cwd (worktrees and
+    submodules use a .git file) or it has no origin remote, so the caller
+    can fall back to asking git.
+    """
+    for directory in (Path(cwd), *Path(cwd).parents):
+        git_dir = directory / ".git"
+        if git_dir.exists():
+            if not git_dir.is_dir():
+                return None
+            try:
+                config = (git_dir / "config").read_text(encoding="utf-8")
+            except OSError:
+                return None
+            # Like `git config --get`, the last url = line wins
+            urls = [
+                match.group(1)
+                for section in _ORIGIN_SECTION_RE.finditer(config)
+                for match in _URL_LINE_RE.finditer(section.group(1))
+            ]
+            return _config_value(urls[-1]) if urls else None
+    return None
+
+
+def _config_value(raw: str) -> str:
+    """
+    Decode a raw .git/config value the way `git config --get` prints it.
+
+    Double quotes are removed, backslash escapes decoded and an unquoted
+    ; or # starts a comment. Surrounding whitespace is dropped.
+    """
+    value = []
+    quoted = False
+    chars = iter(raw)
+    for char in chars:
+        if char == '"':
+            quoted = not quoted
+        elif char == "\\":
+            escaped = next(chars, "")
+            value.append(_CONFIG_ESCAPES.get(escaped, escaped))
+        elif char in ";#" and not quoted:
+            break
+        else:
+            value.append(char)
+    return "".join(value).strip()
+
+
+def is_mcp_available(refresh: bool = False) -> bool:
+    """
+    Check whether the MCP Agent Mail server is reachable.
+
+    The server is probed once per process and the answer is cached;
+    pass refresh=True to probe again (e.g. after starting the server).
+    """
+    global _MCP_AVAILABLE
+    if _MCP_AVAILABLE is None or refresh:
+        uds = _socket_path()
+        transport = httpx.HTTPTransport(uds=uds) if uds else None
+        try:
+            with httpx.Client(base_url=MCP_BASE_URL, transport=transport, timeout=2) as client:
+                _MCP_AVAILABLE = client.get("/health/readiness").is_success
+        except httpx.HTTPError:
+            _MCP_AVAILABLE = False
+    return _MCP_AVAILABLE
+
+
+def _socket_path() -> Optional[str]:
+    """Return MCP_AGENT_MAIL_SOCKET if the server's socket exists, else None."""
+    if MCP_AGENT_MAIL_SOCKET and Path(MCP_AGENT_MAIL_SOCKET).is_socket():
+        return MCP_AGENT_MAIL_SOCKET
+    return None
+
+
+def _get_client() -> httpx.AsyncClient:
+    """Return the shared client, creating it for the running event loop if needed."""
+    global _client, _client_loop
+    loop = asyncio.get_running_loop()
+    if _client is None or _client.is_closed or _client_loop is not loop:
+        uds = _socket_path()
+        # Requests still carry MCP_BASE_URL's host; over the socket it is
+        # only used for the Host header
+        transport = httpx.AsyncHTTPTransport(uds=uds, limits=_POOL_LIMITS) if uds else None
+        _client = httpx.AsyncClient(
+            base_url=MCP_BASE_URL,
+            timeout=_TIMEOUT,
+            limits=_POOL_LIMITS,
+            transport=transport
+        )
+        _client_loop = loop
+    return _client
+
+
+async def close_client() -> None:
+    """
+    Close the shared HTTP client and its pooled connections.
+
+    Call before the event loop shuts down; the next helper call opens a
+    new client.
+    """
+    global _client, _client_loop
+    client, _client, _client_loop = _client, None, None
+    if client is not None:
+        await client.aclose()
+
+
+class _MailResultFields(TypedDict):
+    success: bool
+    response: Optional[Dict[str, Any]]
+    error: Optional[str]
+
+
+class MailResult(_MailResultFields, total=False):
+    """
+    Result returned by every helper: {"success", "response", "error"}.
+
+    Failures that may clear if the call is repeated (transport errors, 5xx
+    replies) also carry "retryable": True.
+    """
+
+    retryable: bool
+
+
+def _encode(payload: Any) -> bytes:
+    """
+    Serialize a payload to JSON.
+
+    Unserializable content raises ValueError rather than TypeError, so it is
+    reported in the result dict while TypeErrors from bad calls still raise.
+    """
+    try:
+        return _dumps(payload)
+    except TypeError as e:
+        raise ValueError(f"Payload is not JSON serializable: {e}") from e
+
+
+async def _post(path: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+    """POST a JSON payload to the server and return the decoded reply."""
+    response = await _get_client().post(path, content=_encode(payload), headers=_JSON_HEADERS)
+    response.raise_for_status()
+    return _loads(response.content)
+
+
+async def _get(
+    path: str,
+    params: Dict[str, Any],
+    timeout: Any = httpx.USE_CLIENT_DEFAULT
+) -> Dict[str, Any]:
+    """
+    GET a server endpoint and return the decoded reply.
+
+    Transport errors and 502/503/504 replies are retried up to
+    _GET_ATTEMPTS times in total; retry n first sleeps 0.1 * 2**n seconds,
+    randomized by +/- 10%.
+    """
+    client = _get_client()
+    for attempt in range(_GET_ATTEMPTS):
+        last_attempt = attempt == _GET_ATTEMPTS - 1
+        try:
+            response = await client.get(path, params=params, timeout=timeout)
+        except httpx.TransportError:
+            if last_attempt:
+                raise
+        else:
+            if response.status_code not in _RETRY_STATUSES or last_attempt:
+                response.raise_for_status()
+                return _loads(response.content)
+        await asyncio.sleep(0.1 * 2 ** attempt * random.uniform(0.9, 1.1))
+
+
+def _as_content(content: Any) -> Dict[str, Any]:
+    """Return message content as a dict, converting dataclass instances."""
+    if is_dataclass(content) and not isinstance(content, type):
+        return asdict(content)
+    return content
+
+
+def _message_type(content: Any) -> Optional[str]:
+    """Return the content's "type" field, sent alongside it so inboxes can list it."""
+    return content.get("type") if isinstance(content, dict) else None
+
+
+def _idempotency_key(sender_name: str, recipient_name: str, content: Dict[str, Any]) -> str:
+    """
+    Return the default idempotency key for a send.
+
+    Content carrying a "message_id" gets a key derived from it, so every
+    retry of that message carries the same key. Anything else gets a fresh
+    key: identical content sent twice is two messages, not a duplicate.
+    """
+    message_id = content.get("message_id")
+    if message_id is None:
+        return uuid.uuid4().hex
+    return uuid.uuid5(_IDEMPOTENCY_NS, f"{sender_name}:{recipient_name}:{message_id}").hex
+
+
+def _to_result(result: Dict[str, Any]) -> MailResult:
+    """Convert a server reply into the {"success", "response", "error"} shape."""
+    if result.get("success"):
+        return {"success": True, "response": result.get("response", {}), "error": None}
+    return {"success": False, "response": None, "error": result.get("error", "Unknown error")}
 
 
+# Failures reported in the result dict instead of raised: transport/HTTP errors
+# and undecodable replies or unserializable payloads (ValueError, see _encode)
+_CALL_ERRORS = (httpx.HTTPError, ValueError)
+
+
+def _is_transient(exc: Exception) -> bool:
+    """Return True for call errors worth retrying: transport errors and 5xx replies."""
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code >= 500
+    return isinstance(exc, httpx.TransportError)
+
+
+def _safe_call(fn):
+    """
+    Wrap a helper that returns the decoded server reply.
+
+    The wrapper converts the reply into the {"success", "response", "error"}
+    shape and reports expected failures the same way. Anything else,
+    including asyncio cancellation, propagates to the caller. Decorated
+    helpers are annotated with the wrapper's MailResult return type.
+    """
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs) -> MailResult:
+        try:
+            return _to_result(await fn(*args, **kwargs))
+        except _CALL_ERRORS as e:
+            result: MailResult = {"success": False, "response": None, "error": str(e)}
+            if _is_transient(e):
+                result["retryable"] = True
+            return result
+
+    return wrapper
+
+
+@_safe_call
 async def register_agent(
     agent_name: str,
     model: str = "unknown",
     task_description: str = "",
     mcp_client: Any = None
-) -> Dict[str, Any]:
+) -> MailResult:
     """
     Register an agent with MCP Agent Mail.
 
@@ -91,104 +419,63 @@ async def register_agent(
     """
     project_key = get_project_key()
 
-    try:
-        response = requests.post(
-            f"{MCP_BASE_URL}/api/v1/agents/register",
-            json={
-                "agent_name": agent_name,
-                "project_key": project_key,
-                "model": model,
-                "task_description": task_description
-            },
-            timeout=10
-        )
-
-        response.raise_for_status()
-        result = response.json()
-
-        if result.get("success"):
-            return {
-                "success": True,
-                "response": result.get("response", {}),
-                "error": None
-            }
-        else:
-            return {
-                "success": False,
-                "response": None,
-                "error": result.get("error", "Unknown error")
-            }
-    except Exception as e:
-        return {
-            "success": False,
-            "response": None,
-            "error": str(e)
-        }
+    return await _post("/api/v1/agents/register", {
+        "agent_name": agent_name,
+        "project_key": project_key,
+        "model": model,
+        "task_description": task_description
+    })
 
 
+@_safe_call
 async def send_message(
     sender_name: str,
     recipient_name: str,
-    content: Dict[str, Any],
+    content: Any,
     mcp_client: Any = None,
-    importance: str = "normal"
-) -> Dict[str, Any]:
+    importance: str = "normal",
+    idempotency_key: Optional[str] = None
+) -> MailResult:
     """
     Send a message to another agent.
 
     Args:
         sender_name: Name of the sending agent
         recipient_name: Name of the recipient agent
-        content: Message content (dict)
+        content: Message content (dict or dataclass instance); its "type"
+            field is also sent as the message type
         mcp_client: Ignored (for compatibility)
         importance: Message importance ("low", "normal", "high", "critical")
+        idempotency_key: Key the server uses to drop duplicate sends; pass
+            the same key when retrying a send (default: derived from the
+            content's "message_id" if it has one, else a fresh key)
 
     Returns:
         {"success": bool, "response": {...}, "error": str}
     """
     project_key = get_project_key()
-
-    try:
-        response = requests.post(
-            f"{MCP_BASE_URL}/api/v1/messages/send",
-            json={
-                "project_key": project_key,
-                "sender_name": sender_name,
-                "recipient_name": recipient_name,
-                "content": content,
-                "importance": importance
-            },
-            timeout=10
+    content = _as_content(content)
+
+    return await _post("/api/v1/messages/send", {
+        "project_key": project_key,
+        "sender_name": sender_name,
+        "recipient_name": recipient_name,
+        "content": content,
+        "type": _message_type(content),
+        "importance": importance,
+        "idempotency_key": idempotency_key or _idempotency_key(
+            sender_name, recipient_name, content
         )
-
-        response.raise_for_status()
-        result = response.json()
-
-        if result.get("success"):
-            return {
-                "success": True,
-                "response": result.get("response", {}),
-                "error": None
-            }
-        else:
-            return {
-                "success": False,
-                "response": None,
-                "error": result.get("error", "Unknown error")
-            }
-    except Exception as e:
-        return {
-            "success": False,
-            "response": None,
-            "error": str(e)
-        }
+    })
 
 
+@_safe_call
 async def fetch_inbox(
     agent_name: str,
     limit: int = 50,
-    mcp_client: Any = None
-) -> Dict[str, Any]:
+    mcp_client: Any = None,
+    wait_seconds: float = 0
+) -> MailResult:
     """
     Fetch messages from agent's inbox.
 
@@ -196,51 +483,104 @@ async def fetch_inbox(
         agent_name: Name of the agent
         limit: Maximum number of messages to fetch
         mcp_client: Ignored (for compatibility)
+        wait_seconds: Long-poll: let the server hold the request for up to
+            this many seconds until a message arrives (default: 0, no wait)
 
     Returns:
         {"success": bool, "response": {"messages": [...]}, "error": str}
     """
     project_key = get_project_key()
 
-    try:
-        response = requests.get(
-            f"{MCP_BASE_URL}/api/v1/messages/inbox",
-            params={
-                "project_key": project_key,
-                "agent_name": agent_name,
-                "limit": limit
-            },
-            timeout=10
-        )
+    return await _get(*_inbox_request({
+        "project_key": project_key,
+        "agent_name": agent_name,
+        "limit": limit
+    }, wait_seconds))
+
+
+def _inbox_request(params: Dict[str, Any], wait_seconds: float) -> tuple:
+    """Return the _get() arguments for an inbox fetch, long-polling if wait_seconds."""
+    if not wait_seconds:
+        return "/api/v1/messages/inbox", params
+    # Leave the server the whole wait before the read times out
+    return (
+        "/api/v1/messages/inbox",
+        {**params, "wait_seconds": wait_seconds},
+        httpx.Timeout(_TIMEOUT.read, connect=_CONNECT_TIMEOUT, read=_TIMEOUT.read + wait_seconds)
+    )
 
-        response.raise_for_status()
-        result = response.json()
 
-        if result.get("success"):
-            return {
-                "success": True,
-                "response": result.get("response", {}),
-                "error": None
-            }
+async def stream_inbox(
+    agent_name: str,
+    limit: int = 50,
+    poll_interval: float = 0.1,
+    max_interval: float = 1.0,
+    mcp_client: Any = None,
+    wait_seconds: float = 0
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Yield inbox messages as they arrive.
+
+    Polls fetch_inbox() with adaptive backoff: the delay starts at
+    poll_interval, doubles while the inbox is idle (up to max_interval)
+    and resets as soon as a new message shows up. With wait_seconds each
+    fetch long-polls instead, and the next one starts straight away; the
+    backoff then only applies when the server answers early with nothing
+    new (e.g. it does not support long-polling). Each message is yielded
+    once, even if it stays unacknowledged on the server.
+
+    Args:
+        agent_name: Name of the agent
+        limit: Maximum number of messages to fetch per poll
+        poll_interval: Initial delay between polls in seconds (default: 0.1)
+        max_interval: Upper bound for the delay in seconds (default: 1.0)
+        mcp_client: Ignored (for compatibility)
+        wait_seconds: Long-poll each fetch for up to this many seconds
+            (default: 0, plain polling)
+
+    Yields:
+        Message dicts, as returned in fetch_inbox()["response"]["messages"]
+    """
+    # Yielded message IDs, least recently fetched first; bounded, and IDs
+    # still in the inbox are kept by moving them to the end
+    seen: OrderedDict = OrderedDict()
+    interval = poll_interval
+
+    while True:
+        started = time.monotonic()
+        result = await fetch_inbox(agent_name, limit=limit, wait_seconds=wait_seconds)
+        new_messages = []
+        if result["success"]:
+            for msg in result["response"].get("messages", []):
+                message_id = msg.get("id")
+                if message_id in seen:
+                    seen.move_to_end(message_id)
+                else:
+                    seen[message_id] = None
+                    new_messages.append(msg)
+            while len(seen) > _STREAM_SEEN_LIMIT:
+                seen.popitem(last=False)
+
+        for msg in new_messages:
+            yield msg
+
+        if new_messages:
+            interval = poll_interval
+            if wait_seconds:
+                continue
+        elif wait_seconds and time.monotonic() - started >= wait_seconds:
+            continue  # The server held the fetch for the whole wait
         else:
-            return {
-                "success": False,
-                "response": None,
-                "error": result.get("error", "Unknown error")
-            }
-    except Exception as e:
-        return {
-            "success": False,
-            "response": None,
-            "error": str(e)
-        }
+            interval = min(interval * 2, max_interval)
+        await asyncio.sleep(interval)
 
 
+@_safe_call
 async def acknowledge_message(
     agent_name: str,
     message_id: str,
     mcp_client: Any = None
-) -> Dict[str, Any]:
+) -> MailResult:
     """
     Mark a message as processed (acknowledged).
 
@@ -254,47 +594,21 @@ async def acknowledge_message(
     """
     project_key = get_project_key()
 
-    try:
-        response = requests.post(
-            f"{MCP_BASE_URL}/api/v1/messages/acknowledge",
-            json={
-                "project_key": project_key,
-                "agent_name": agent_name,
-                "message_id": message_id
-            },
-            timeout=10
-        )
-
-        response.raise_for_status()
-        result = response.json()
-
-        if result.get("success"):
-            return {
-                "success": True,
-                "response": result.get("response", {}),
-                "error": None
-            }
-        else:
-            return {
-                "success": False,
-                "response": None,
-                "error": result.get("error", "Unknown error")
-            }
-    except Exception as e:
-        return {
-            "success": False,
-            "response": None,
-            "error": str(e)
-        }
+    return await _post("/api/v1/messages/acknowledge", {
+        "project_key": project_key,
+        "agent_name": agent_name,
+        "message_id": message_id
+    })
 
 
+@_safe_call
 async def reserve_file_paths(
     agent_name: str,
     paths: list,
     ttl_seconds: int = 3600,
     exclusive: bool = False,
     mcp_client: Any = None
-) -> Dict[str, Any]:
+) -> MailResult:
     """
     Reserve file paths to prevent conflicts.
 
@@ -310,46 +624,20 @@ async def reserve_file_paths(
     """
     project_key = get_project_key()
 
-    try:
-        response = requests.post(
-            f"{MCP_BASE_URL}/api/v1/files/reserve",
-            json={
-                "project_key": project_key,
-                "agent_name": agent_name,
-                "paths": paths,
-                "ttl_seconds": ttl_seconds,
-                "exclusive": exclusive
-            },
-            timeout=10
-        )
-
-        response.raise_for_status()
-        result = response.json()
-
-        if result.get("success"):
-            return {
-                "success": True,
-                "response": result.get("response", {}),
-                "error": None
-            }
-        else:
-            return {
-                "success": False,
-                "response": None,
-                "error": result.get("error", "Unknown error")
-            }
-    except Exception as e:
-        return {
-            "success": False,
-            "response": None,
-            "error": str(e)
-        }
+    return await _post("/api/v1/files/reserve", {
+        "project_key": project_key,
+        "agent_name": agent_name,
+        "paths": paths,
+        "ttl_seconds": ttl_seconds,
+        "exclusive": exclusive
+    })
 
 
+@_safe_call
 async def release_file_reservations(
     agent_name: str,
     mcp_client: Any = None
-) -> Dict[str, Any]:
+) -> MailResult:
     """
     Release all file reservations for an agent.
 
@@ -362,34 +650,270 @@ async def release_file_reservations(
     """
     project_key = get_project_key()
 
-    try:
-        response = requests.post(
-            f"{MCP_BASE_URL}/api/v1/files/release",
-            json={
-                "project_key": project_key,
-                "agent_name": agent_name
-            },
-            timeout=10
+    return await _post("/api/v1/files/release", {
+        "project_key": project_key,
+        "agent_name": agent_name
+    })
+
+
+class MailSession:
+    """
+    Per-agent helper that binds project_key and agent_name once.
+
+    The module-level helpers resolve the project key and rebuild the full
+    payload on every call. A session keeps the constant part of each payload
+    and only adds the per-call fields.
+
+    Usage:
+        session = MailSession("my-agent")
+        inbox = await session.fetch_inbox(limit=20)
+        await session.acknowledge(message_id)
+    """
+
+    __slots__ = ("agent_name", "project_key", "_agent_args", "_sender_args")
+
+    def __init__(self, agent_name: str, project_key: Optional[str] = None):
+        self.agent_name = agent_name
+        self.project_key = project_key or get_project_key()
+        self._agent_args = {"project_key": self.project_key, "agent_name": agent_name}
+        self._sender_args = {"project_key": self.project_key, "sender_name": agent_name}
+
+    @_safe_call
+    async def send(
+        self,
+        recipient_name: str,
+        content: Any,
+        importance: str = "normal",
+        idempotency_key: Optional[str] = None
+    ) -> MailResult:
+        """Send a message from this agent (see send_message)."""
+        content = _as_content(content)
+        return await _post("/api/v1/messages/send", {
+            **self._sender_args,
+            "recipient_name": recipient_name,
+            "content": content,
+            "type": _message_type(content),
+            "importance": importance,
+            "idempotency_key": idempotency_key or _idempotency_key(
+                self.agent_name, recipient_name, content
+            )
+        })
+
+    @_safe_call
+    async def fetch_inbox(self, limit: int = 50, wait_seconds: float = 0) -> MailResult:
+        """Fetch this agent's inbox (see fetch_inbox)."""
+        return await _get(*_inbox_request({**self._agent_args, "limit": limit}, wait_seconds))
+
+    @_safe_call
+    async def acknowledge(self, message_id: str) -> MailResult:
+        """Acknowledge a message for this agent (see acknowledge_message)."""
+        return await _post(
+            "/api/v1/messages/acknowledge", {**self._agent_args, "message_id": message_id}
         )
 
-        response.raise_for_status()
-        result = response.json()
+    @_safe_call
+    async def reserve(
+        self,
+        paths: list,
+        ttl_seconds: int = 3600,
+        exclusive: bool = False
+    ) -> MailResult:
+        """Reserve file paths for this agent (see reserve_file_paths)."""
+        return await _post("/api/v1/files/reserve", {
+            **self._agent_args,
+            "paths": paths,
+            "ttl_seconds": ttl_seconds,
+            "exclusive": exclusive
+        })
+
+    @_safe_call
+    async def release(self) -> MailResult:
+        """Release all of this agent's reservations (see release_file_reservations)."""
+        return await _post("/api/v1/files/release", self._agent_args)
+
+
+class ReservationCache:
+    """
+    Reuse live file reservations instead of reserving the same paths again.
+
+    Successful reservations are remembered per (project_key, agent_name,
+    paths, exclusive). Reserving the same set again returns the remembered
+    result without a server call while the reservation still covers the
+    requested ttl_seconds (plus margin); otherwise it is reserved again.
+    Concurrent reserves for the same key share a single request if it asked
+    for at least as long a TTL.
+
+    Usage:
+        cache = ReservationCache()
+        await cache.reserve("my-agent", ["src/**/*.ts"], ttl_seconds=600)
+        await cache.release("my-agent")
+    """
 
-        if result.get("success"):
-            return {
-                "success": True,
-                "response": result.get("response", {}),
-                "error": None
-            }
-        else:
-            return {
-                "success": False,
-                "response": None,
-                "error": result.get("error", "Unknown error")
-            }
-    except Exception as e:
-        return {
-            "success": False,
-            "response": None,
-            "error": str(e)
-        }
+    __slots__ = ("margin", "_live", "_pending")
+
+    def __init__(self, margin: float = 5.0):
+        self.margin = margin
+        self._live: Dict[tuple, tuple] = {}  # key -> (expires_at, result)
+        self._pending: Dict[tuple, tuple] = {}  # key -> (ttl_seconds, future)
+
+    async def reserve(
+        self,
+        agent_name: str,
+        paths: list,
+        ttl_seconds: int = 3600,
+        exclusive: bool = False
+    ) -> MailResult:
+        """Reserve file paths, reusing a live reservation (see reserve_file_paths)."""
+        key = (get_project_key(), agent_name, tuple(sorted(paths)), exclusive)
+        now = time.monotonic()
+
+        live = self._live.get(key)
+        if live is not None:
+            expires_at, result = live
+            if expires_at - self.margin - now >= ttl_seconds:
+                return result
+            del self._live[key]
+
+        pending = self._pending.get(key)
+        if pending is None or pending[0] < ttl_seconds:
+            future = asyncio.ensure_future(reserve_file_paths(
+                agent_name, list(key[2]), ttl_seconds=ttl_seconds, exclusive=exclusive
+            ))
+            pending = self._pending[key] = (ttl_seconds, future)
+            future.add_done_callback(functools.partial(self._store, key, now + ttl_seconds))
+        # Shielded so one caller's cancellation does not fail the others
+        return await asyncio.shield(pending[1])
+
+    async def release(self, agent_name: str) -> MailResult:
+        """Release the agent's reservations and forget them (see release_file_reservations)."""
+        project_key = get_project_key()
+        for key in [k for k in self._live if k[:2] == (project_key, agent_name)]:
+            del self._live[key]
+        # Reserves still in flight are not remembered when they complete
+        for key in [k for k in self._pending if k[:2] == (project_key, agent_name)]:
+            del self._pending[key]
+        return await release_file_reservations(agent_name)
+
+    def _store(self, key: tuple, expires_at: float, future: asyncio.Future) -> None:
+        pending = self._pending.get(key)
+        if pending is None or pending[1] is not future:
+            return  # Released, or superseded by a reserve with a longer TTL
+        del self._pending[key]
+        if future.cancelled() or future.exception() is not None:
+            return
+        result = future.result()
+        if result["success"]:
+            self._live[key] = (expires_at, result)
+
+
+class MCPBatcher:
+    """
+    Coalesce bursts of outbound calls into batches.
+
+    Calls submitted within max_delay seconds of the first queued call (up to
+    max_batch of them) are flushed together with asyncio.gather. The HTTP API
+    has no batch endpoint, so each call is still its own request, but a burst
+    of sends/acks is dispatched as one batch instead of one await at a time.
+
+    Usage:
+        batcher = MCPBatcher(max_batch=32, max_delay=0.01)
+        await asyncio.gather(*(batcher.acknowledge_message("me", mid) for mid in ids))
+        await batcher.close()
+    """
+
+    __slots__ = ("max_batch", "max_delay", "_queue", "_worker", "_batch")
+
+    def __init__(self, max_batch: int = 32, max_delay: float = 0.01):
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        # Calls taken off the queue by the worker and not yet resolved
+        self._batch: list = []
+
+    async def submit(self, fn, *args, **kwargs) -> Any:
+        """Queue fn(*args, **kwargs) for the next batch and wait for its result."""
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        if self._worker is None or self._worker.done():
+            # Reuses the queue, so calls queued for a stopped worker still run
+            self._worker = asyncio.create_task(self._run())
+
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((fn, args, kwargs, future))
+        return await future
+
+    async def send_message(
+        self,
+        sender_name: str,
+        recipient_name: str,
+        content: Any,
+        importance: str = "normal"
+    ) -> MailResult:
+        """Batched send_message()."""
+        return await self.submit(
+            send_message, sender_name, recipient_name, content, importance=importance
+        )
+
+    async def acknowledge_message(self, agent_name: str, message_id: str) -> MailResult:
+        """Batched acknowledge_message()."""
+        return await self.submit(acknowledge_message, agent_name, message_id)
+
+    async def close(self) -> None:
+        """Stop the background worker and cancel every call not yet resolved."""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+        # Calls being collected or flushed when the worker stopped, then
+        # calls still waiting in the queue
+        for *_, future in self._batch:
+            future.cancel()
+        self._batch = []
+        if self._queue is not None:
+            while not self._queue.empty():
+                *_, future = self._queue.get_nowait()
+                future.cancel()
+            self._queue = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            self._batch = batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_delay
+
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            await self._flush(batch)
+            self._batch = []
+
+    @staticmethod
+    async def _call(fn, args: tuple, kwargs: dict) -> Any:
+        # Errors raised by the call itself (e.g. a bad argument) reach the
+        # caller's future instead of escaping _flush and stopping the worker
+        return await fn(*args, **kwargs)
+
+    @classmethod
+    async def _flush(cls, batch: list) -> None:
+        results = await asyncio.gather(
+            *(cls._call(fn, args, kwargs) for fn, args, kwargs, _ in batch),
+            return_exceptions=True
+        )
+        for (*_, future), result in zip(batch, results):
+            if future.done():
+                continue  # Caller went away
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Tests for CircuitBreaker in docs/integrations/mcp-agent-mail/examples/mcp_vs_fallback.py
+Checks the CLOSED -> OPEN -> HALF_OPEN -> CLOSED state machine and which
+delegation outcomes count against it
+"""
+
+import sys
+import os
+import time
+import asyncio
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'lib', 'mcp-agent-mail'))
+sys.path.insert(0, os.path.join(
+    os.path.dirname(__file__), '..', '..', 'docs', 'integrations', 'mcp-agent-mail', 'examples'
+))
+
+import mcp_vs_fallback
+from mcp_vs_fallback import CircuitBreaker, FlexibleOrchestrator
+
+
+def _open_breaker(breaker):
+    """Record enough failures to open the breaker."""
+    for _ in range(breaker.failure_threshold):
+        assert breaker.can_execute()
+        breaker.record_outcome(False)
+
+
+def test_opens_after_threshold():
+    """Test that consecutive failures open the circuit"""
+    print("✓ Test 1: Opens after failure_threshold failures")
+
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+    breaker.record_outcome(False)
+    breaker.record_outcome(False)
+    breaker.record_outcome(True)  # Resets the count
+    breaker.record_outcome(False)
+    breaker.record_outcome(False)
+    if breaker.state != CircuitBreaker.CLOSED:
+        print(f"  ❌ Opened early: {breaker.state}")
+        return False
+
+    breaker.record_outcome(False)
+    if breaker.state == CircuitBreaker.OPEN and not breaker.can_execute():
+        print("  ✅ Open after 3 consecutive failures, calls rejected")
+        return True
+    print(f"  ❌ Expected OPEN and rejected calls, got {breaker.state}")
+    return False
+
+
+def test_half_open_probes():
+    """Test that a half-open circuit allows half_open_calls probes and then closes"""
+    print("✓ Test 2: Half-open probes close the circuit")
+
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.01, half_open_calls=3)
+    _open_breaker(breaker)
+    time.sleep(0.02)
+
+    allowed = [breaker.can_execute() for _ in range(4)]
+    if allowed != [True, True, True, False] or breaker.state != CircuitBreaker.HALF_OPEN:
+        print(f"  ❌ Expected three probes, got {allowed} in {breaker.state}")
+        return False
+
+    for _ in range(3):
+        breaker.record_outcome(True)
+    if breaker.state == CircuitBreaker.CLOSED and breaker.can_execute():
+        print("  ✅ Three probes allowed, closed after three successes")
+        return True
+    print(f"  ❌ Expected CLOSED, got {breaker.state}")
+    return False
+
+
+def test_half_open_failure_reopens():
+    """Test that a failed probe opens the circuit again"""
+    print("✓ Test 3: Failed probe reopens the circuit")
+
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.01)
+    _open_breaker(breaker)
+    time.sleep(0.02)
+
+    breaker.can_execute()
+    breaker.record_outcome(False)
+    if breaker.state == CircuitBreaker.OPEN and not breaker.can_execute():
+        print("  ✅ Back to OPEN")
+        return True
+    print(f"  ❌ Expected OPEN, got {breaker.state}")
+    return False
+
+
+def _delegate(orchestrator, count):
+    """Delegate count tasks in MCP mode and return the modes they ran in."""
+    async def run():
+        return [
+            (await orchestrator.delegate_task(
+                f"task-{i}", "Demo task", "frontend-specialist", ["src/*.py"]
+            ))["mode"]
+            for i in range(count)
+        ]
+    return asyncio.run(run())
+
+
+def _orchestrator(reserve_result, send_result, breaker):
+    """FlexibleOrchestrator in MCP mode whose reserve/send return fixed results."""
+    async def reserve_file_paths(**kwargs):
+        return reserve_result
+
+    async def send_message(**kwargs):
+        return send_result
+
+    async def fast_direct(task_id, *args):
+        return {"status": "complete", "mode": "direct"}
+
+    mcp_vs_fallback.reserve_file_paths = reserve_file_paths
+    mcp_vs_fallback.send_message = send_message
+    orchestrator = FlexibleOrchestrator()
+    orchestrator.mode = "mcp"
+    orchestrator.breaker = breaker
+    orchestrator._delegate_task_direct = fast_direct
+    return orchestrator
+
+
+def test_refusals_do_not_trip():
+    """Test that calls the server answers but refuses don't open the circuit"""
+    print("✓ Test 4: Refusals don't count as failures")
+
+    breaker = CircuitBreaker(failure_threshold=5, reset_timeout=60)
+    orchestrator = _orchestrator(
+        {"success": False, "response": None, "error": "conflict"},
+        {"success": False, "response": None, "error": "unknown recipient"},
+        breaker
+    )
+    _delegate(orchestrator, 6)
+    if breaker.state == CircuitBreaker.CLOSED:
+        print("  ✅ Six refused delegations, circuit still closed")
+        return True
+    print(f"  ❌ Expected CLOSED, got {breaker.state}")
+    return False
+
+
+def test_server_errors_trip():
+    """Test that retryable failures do open the circuit"""
+    print("✓ Test 5: Server errors count as failures")
+
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+    orchestrator = _orchestrator(
+        {"success": False, "response": None, "error": "503", "retryable": True},
+        {"success": False, "response": None, "error": "503", "retryable": True},
+        breaker
+    )
+    orchestrator._retry = lambda op: op()  # No backoff sleeps in the test
+    modes = _delegate(orchestrator, 4)
+    if breaker.state == CircuitBreaker.OPEN and modes == ["direct"] * 4:
+        print("  ✅ Open after three failed delegations")
+        return True
+    print(f"  ❌ Expected OPEN, got {breaker.state} {modes}")
+    return False
+
+
+def test_one_probe_per_delegation():
+    """Test that a delegation uses one half-open probe"""
+    print("✓ Test 6: One half-open probe per delegation")
+
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.01, half_open_calls=3)
+    _open_breaker(breaker)
+    time.sleep(0.02)
+    orchestrator = _orchestrator(
+        {"success": True, "response": {}, "error": None},
+        {"success": True, "response": {}, "error": None},
+        breaker
+    )
+
+    modes = _delegate(orchestrator, 2)
+    if modes == ["mcp", "mcp"] and breaker._half_open_attempted_calls == 2:
+        print("  ✅ Two delegations used two probes")
+        return True
+    print(f"  ❌ Got {modes} with {breaker._half_open_attempted_calls} probes used")
+    return False
+
+
+def main():
+    print("=" * 60)
+    print("TEST: CircuitBreaker state machine")
+    print("=" * 60)
+    print()
+
+    tests = [
+        test_opens_after_threshold,
+        test_half_open_probes,
+        test_half_open_failure_reopens,
+        test_refusals_do_not_trip,
+        test_server_errors_trip,
+        test_one_probe_per_delegation
+    ]
+
+    results = []
+    for test in tests:
+        try:
+            result = test()
+            results.append(result)
+        except Exception as e:
+            print(f"  ❌ Test failed: {e}")
+            results.append(False)
+        print()
+
+    passed = sum(results)
+    total = len(results)
+    print("=" * 60)
+    print(f"TEST SUMMARY: {passed}/{total} tests passed")
+    print("=" * 60)
+
+    if passed == total:
+        print("✅ ALL TESTS PASSED")
+        return 0
+    else:
+        print("❌ SOME TESTS FAILED - Review and fix")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Tests for MCPBatcher in lib/mcp-agent-mail/mcp_agent_mail_client.py
+Checks that close() resolves every pending call, wherever it is, and that
+a failing call only fails its own caller
+"""
+
+import sys
+import os
+import asyncio
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'lib', 'mcp-agent-mail'))
+
+from mcp_agent_mail_client import MCPBatcher
+
+
+async def _cancelled_by_close(batcher, task):
+    """Close the batcher and check that the pending task was cancelled."""
+    await batcher.close()
+    try:
+        await asyncio.wait_for(task, 1)
+    except asyncio.CancelledError:
+        return True
+    except asyncio.TimeoutError:
+        print("  ❌ Caller still waiting after close()")
+        return False
+    print("  ❌ Call completed instead of being cancelled")
+    return False
+
+
+def test_close_while_collecting():
+    """Test close() while the worker is still collecting a batch"""
+    print("✓ Test 1: close() during batch collection")
+
+    async def run():
+        batcher = MCPBatcher(max_batch=8, max_delay=60)
+
+        async def call():
+            return "never flushed"
+
+        task = asyncio.create_task(batcher.submit(call))
+        # Let the worker take the call off the queue and wait for more
+        while not batcher._batch:
+            await asyncio.sleep(0)
+        return await _cancelled_by_close(batcher, task)
+
+    if asyncio.run(run()):
+        print("  ✅ Call being collected was cancelled")
+        return True
+    return False
+
+
+def test_close_while_flushing():
+    """Test close() while a batch is in flight"""
+    print("✓ Test 2: close() during flush")
+
+    async def run():
+        batcher = MCPBatcher(max_batch=1, max_delay=0)
+        started = asyncio.Event()
+
+        async def call():
+            started.set()
+            await asyncio.Event().wait()  # Server never answers
+
+        task = asyncio.create_task(batcher.submit(call))
+        await asyncio.wait_for(started.wait(), 1)
+        return await _cancelled_by_close(batcher, task)
+
+    if asyncio.run(run()):
+        print("  ✅ In-flight call was cancelled")
+        return True
+    return False
+
+
+def test_reuse_after_close():
+    """Test that the batcher works again after close()"""
+    print("✓ Test 3: submit() after close()")
+
+    async def run():
+        batcher = MCPBatcher(max_batch=4, max_delay=0.001)
+
+        async def call(value):
+            return value * 2
+
+        first = await batcher.submit(call, 1)
+        await batcher.close()
+        second = await batcher.submit(call, 2)
+        await batcher.close()
+        return first, second
+
+    if asyncio.run(run()) == (2, 4):
+        print("  ✅ Batcher restarts cleanly")
+        return True
+    print("  ❌ Unexpected results after restart")
+    return False
+
+
+def test_bad_call_fails_only_its_caller():
+    """Test that a call raising on invocation doesn't stall the batch"""
+    print("✓ Test 4: Bad call in a batch")
+
+    async def run():
+        batcher = MCPBatcher(max_batch=4, max_delay=0.01)
+
+        async def call(value):
+            return value * 2
+
+        results = await asyncio.wait_for(asyncio.gather(
+            batcher.submit(call, 1),
+            batcher.submit(call, 1, 2),  # TypeError when called
+            batcher.submit(call, 3),
+            return_exceptions=True
+        ), 1)
+        after = await asyncio.wait_for(batcher.submit(call, 4), 1)
+        await batcher.close()
+        return results, after
+
+    try:
+        (first, bad, third), after = asyncio.run(run())
+    except asyncio.TimeoutError:
+        print("  ❌ Callers still waiting after a bad call")
+        return False
+    if (first, third, after) == (2, 6, 8) and isinstance(bad, TypeError):
+        print("  ✅ TypeError reached its caller, the rest completed")
+        return True
+    print(f"  ❌ Unexpected results: {first}, {bad!r}, {third}, {after}")
+    return False
+
+
+def main():
+    print("=" * 60)
+    print("TEST: MCPBatcher shutdown")
+    print("=" * 60)
+    print()
+
+    tests = [
+        test_close_while_collecting,
+        test_close_while_flushing,
+        test_reuse_after_close,
+        test_bad_call_fails_only_its_caller
+    ]
+
+    results = []
+    for test in tests:
+        try:
+            result = test()
+            results.append(result)
+        except Exception as e:
+            print(f"  ❌ Test failed: {e}")
+            results.append(False)
+        print()
+
+    passed = sum(results)
+    total = len(results)
+    print("=" * 60)
+    print(f"TEST SUMMARY: {passed}/{total} tests passed")
+    print("=" * 60)
+
+    if passed == total:
+        print("✅ ALL TESTS PASSED")
+        return 0
+    else:
+        print("❌ SOME TESTS FAILED - Review and fix")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
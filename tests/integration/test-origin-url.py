@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Tests for _read_origin_url and _config_value in lib/mcp-agent-mail/mcp_agent_mail_client.py
+Checks that remote.origin.url is read from .git/config the way `git config --get` reads it
+"""
+
+import sys
+import os
+import shutil
+import subprocess
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'lib', 'mcp-agent-mail'))
+
+from mcp_agent_mail_client import _read_origin_url, _config_value
+
+GIT = shutil.which("git")
+
+
+def read_config(config):
+    """Write config to a temporary .git/config and return (ours, git's) origin URL."""
+    with tempfile.TemporaryDirectory() as tmp:
+        git_dir = Path(tmp) / ".git"
+        git_dir.mkdir()
+        (git_dir / "config").write_text(config, encoding="utf-8")
+        (Path(tmp) / "src").mkdir()
+
+        ours = _read_origin_url(str(Path(tmp) / "src"))
+        if GIT is None:
+            return ours, ours
+        git = subprocess.run(
+            [GIT, "config", "--file", str(git_dir / "config"), "--get", "remote.origin.url"],
+            capture_output=True, text=True
+        )
+        return ours, git.stdout.rstrip("\n") if git.returncode == 0 else None
+
+
+def check(config, expected):
+    """Return True if both we and git read expected from config."""
+    ours, git = read_config(config)
+    if ours == expected and git == expected:
+        return True
+    print(f"  ❌ Expected {expected!r}, got {ours!r} (git: {git!r})")
+    return False
+
+
+def test_plain_url():
+    """Test a plain url line, with other remotes and keys around it"""
+    print("✓ Test 1: Plain url")
+
+    config = (
+        '[core]\n\trepositoryformatversion = 0\n'
+        '[remote "upstream"]\n\turl = git@github.com:other/repo.git\n'
+        '[remote "origin"]\n'
+        '\tfetch = +refs/heads/*:refs/remotes/origin/*\n'
+        '\turl = git@github.com:owner/repo.git\n'
+        '[branch "main"]\n\tremote = origin\n'
+    )
+    if check(config, "git@github.com:owner/repo.git"):
+        print("  ✅ origin's url read, upstream's ignored")
+        return True
+    return False
+
+
+def test_quoted_and_commented():
+    """Test quoting, escapes and trailing comments"""
+    print("✓ Test 2: Quoted values and comments")
+
+    ok = check('[remote "origin"]\n\turl = "https://host/a;b#c.git" ; comment\n',
+               "https://host/a;b#c.git")
+    ok = check('[remote "origin"]\n\turl = https://host/repo.git # comment\n',
+               "https://host/repo.git") and ok
+    ok = check('[remote "origin"]\n\turl=https://host/my\\"repo\\".git\n',
+               'https://host/my"repo".git') and ok
+    if ok:
+        print("  ✅ Quotes removed, escapes decoded, comments dropped")
+    return ok
+
+
+def test_last_url_wins():
+    """Test that the last url line wins, also across repeated sections"""
+    print("✓ Test 3: Last url wins")
+
+    ok = check('[remote "origin"]\n\turl = https://host/first.git\n'
+               '\turl = https://host/second.git\n',
+               "https://host/second.git")
+    ok = check('[remote "origin"]\n\turl = https://host/first.git\n'
+               '[core]\n\tbare = false\n'
+               '[remote "origin"]\n\tfetch = +refs/heads/*:refs/remotes/origin/*\n'
+               '\turl = https://host/second.git\n',
+               "https://host/second.git") and ok
+    if ok:
+        print("  ✅ Same URL as git config --get")
+    return ok
+
+
+def test_no_origin():
+    """Test that a config without an origin url returns None"""
+    print("✓ Test 4: No origin url")
+
+    ok = check('[remote "upstream"]\n\turl = https://host/repo.git\n', None)
+    ok = check('[remote "origin"]\n\tfetch = +refs/heads/*:refs/remotes/origin/*\n'
+               '[core]\n\turl = https://host/not-origin.git\n', None) and ok
+    if ok:
+        print("  ✅ None, so the caller falls back to git")
+    return ok
+
+
+def test_config_value():
+    """Test _config_value on raw values directly"""
+    print("✓ Test 5: _config_value decoding")
+
+    cases = {
+        " https://host/repo.git ": "https://host/repo.git",
+        ' "a b" ': "a b",
+        ' "a;b" ; comment': "a;b",
+        " a\\tb": "a\tb",
+        " a\\\\b": "a\\b",
+        "": "",
+    }
+    failed = {raw: _config_value(raw) for raw, expected in cases.items()
+              if _config_value(raw) != expected}
+    if not failed:
+        print(f"  ✅ {len(cases)} raw values decoded")
+        return True
+    print(f"  ❌ Wrongly decoded: {failed}")
+    return False
+
+
+def main():
+    print("=" * 60)
+    print("TEST: remote.origin.url from .git/config")
+    print("=" * 60)
+    if GIT is None:
+        print("(git not installed: not comparing against git config --get)")
+    print()
+
+    tests = [
+        test_plain_url,
+        test_quoted_and_commented,
+        test_last_url_wins,
+        test_no_origin,
+        test_config_value
+    ]
+
+    results = []
+    for test in tests:
+        try:
+            result = test()
+            results.append(result)
+        except Exception as e:
+            print(f"  ❌ Test failed: {e}")
+            results.append(False)
+        print()
+
+    passed = sum(results)
+    total = len(results)
+    print("=" * 60)
+    print(f"TEST SUMMARY: {passed}/{total} tests passed")
+    print("=" * 60)
+
+    if passed == total:
+        print("✅ ALL TESTS PASSED")
+        return 0
+    else:
+        print("❌ SOME TESTS FAILED - Review and fix")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Tests for ReservationCache in lib/mcp-agent-mail/mcp_agent_mail_client.py
+Checks when a remembered reservation is reused and that release() forgets it
+"""
+
+import sys
+import os
+import asyncio
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'lib', 'mcp-agent-mail'))
+
+import mcp_agent_mail_client
+from mcp_agent_mail_client import ReservationCache
+
+
+class FakeServer:
+    """Stands in for the reserve/release helpers and counts reserve calls."""
+
+    def __init__(self):
+        self.reserves = []
+        self.gate = None  # asyncio.Event holding reserves in flight, if set
+
+    async def reserve_file_paths(self, agent_name, paths, ttl_seconds=3600, exclusive=False):
+        self.reserves.append(ttl_seconds)
+        if self.gate is not None:
+            await self.gate.wait()
+        return {"success": True, "response": {"ttl_seconds": ttl_seconds}}
+
+    async def release_file_reservations(self, agent_name):
+        return {"success": True, "response": {}}
+
+
+def run_with_server(scenario):
+    """Run scenario(cache, server) with the client helpers routed to a FakeServer."""
+    server = FakeServer()
+    saved = (mcp_agent_mail_client.reserve_file_paths,
+             mcp_agent_mail_client.release_file_reservations)
+    mcp_agent_mail_client.reserve_file_paths = server.reserve_file_paths
+    mcp_agent_mail_client.release_file_reservations = server.release_file_reservations
+    try:
+        asyncio.run(scenario(ReservationCache(margin=5.0), server))
+    finally:
+        (mcp_agent_mail_client.reserve_file_paths,
+         mcp_agent_mail_client.release_file_reservations) = saved
+    return server.reserves
+
+
+def test_reuse_within_ttl():
+    """Test that a shorter reserve reuses a live reservation"""
+    print("✓ Test 1: Reuse when the reservation covers the TTL")
+
+    async def scenario(cache, server):
+        await cache.reserve("agent", ["src/a.py", "src/b.py"], ttl_seconds=600)
+        await cache.reserve("agent", ["src/b.py", "src/a.py"], ttl_seconds=60)
+
+    reserves = run_with_server(scenario)
+    if reserves == [600]:
+        print("  ✅ Second reserve served from the cache")
+        return True
+    print(f"  ❌ Expected one reserve, got {reserves}")
+    return False
+
+
+def test_longer_ttl_reserves_again():
+    """Test that a longer TTL than the live reservation goes to the server"""
+    print("✓ Test 2: Reserve again when the TTL is not covered")
+
+    async def scenario(cache, server):
+        await cache.reserve("agent", ["src/a.py"], ttl_seconds=60)
+        await cache.reserve("agent", ["src/a.py"], ttl_seconds=600)
+        await cache.reserve("agent", ["src/a.py"], ttl_seconds=300)
+
+    reserves = run_with_server(scenario)
+    if reserves == [60, 600]:
+        print("  ✅ Longer TTL reserved, then reused")
+        return True
+    print(f"  ❌ Expected reserves [60, 600], got {reserves}")
+    return False
+
+
+def test_concurrent_reserves_share_request():
+    """Test that concurrent reserves for the same paths share one request"""
+    print("✓ Test 3: Concurrent reserves share a request")
+
+    async def scenario(cache, server):
+        await asyncio.gather(*(
+            cache.reserve("agent", ["src/a.py"], ttl_seconds=600) for _ in range(5)
+        ))
+
+    reserves = run_with_server(scenario)
+    if reserves == [600]:
+        print("  ✅ One request for five callers")
+        return True
+    print(f"  ❌ Expected one reserve, got {reserves}")
+    return False
+
+
+def test_release_during_reserve():
+    """Test that a reserve in flight during release() is not remembered"""
+    print("✓ Test 4: release() while a reserve is in flight")
+
+    async def scenario(cache, server):
+        server.gate = asyncio.Event()
+        task = asyncio.create_task(cache.reserve("agent", ["src/a.py"], ttl_seconds=600))
+        while not server.reserves:
+            await asyncio.sleep(0)
+        await cache.release("agent")
+        server.gate.set()
+        await task
+        await cache.reserve("agent", ["src/a.py"], ttl_seconds=600)
+
+    reserves = run_with_server(scenario)
+    if reserves == [600, 600]:
+        print("  ✅ Released reservation was not reused")
+        return True
+    print(f"  ❌ Expected two reserves, got {reserves}")
+    return False
+
+
+def main():
+    print("=" * 60)
+    print("TEST: ReservationCache reuse and release")
+    print("=" * 60)
+    print()
+
+    tests = [
+        test_reuse_within_ttl,
+        test_longer_ttl_reserves_again,
+        test_concurrent_reserves_share_request,
+        test_release_during_reserve
+    ]
+
+    results = []
+    for test in tests:
+        try:
+            result = test()
+            results.append(result)
+        except Exception as e:
+            print(f"  ❌ Test failed: {e}")
+            results.append(False)
+        print()
+
+    passed = sum(results)
+    total = len(results)
+    print("=" * 60)
+    print(f"TEST SUMMARY: {passed}/{total} tests passed")
+    print("=" * 60)
+
+    if passed == total:
+        print("✅ ALL TESTS PASSED")
+        return 0
+    else:
+        print("❌ SOME TESTS FAILED - Review and fix")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())